@@ -1,15 +1,31 @@
-# Export the main explanation agent as the default agent
-from .main_agent import main_agent
+def __getattr__(name):
+    """
+    Lazily load the package exports (PEP 562).
 
-# Also export the original RAG management agent if needed
-from .agent import agent as rag_management_agent
-
-# Set main_agent as the root agent for the explanation system
-root_agent = main_agent
-
-# Export the App with resumability enabled (if app.py exists)
-try:
-    from .app import app
-except ImportError:
-    # App configuration not available (fallback for older setups)
-    app = None
\ No newline at end of file
+    - main_agent / root_agent: the main explanation agent, set as the root agent
+      for the explanation system. Built on first access, so importing e.g.
+      rag.config doesn't construct the agent.
+    - app: the App with resumability enabled (None if the ADK version lacks it)
+    - rag_management_agent: the original RAG management agent, which pulls in
+      the GCS storage tools and is only needed when explicitly requested
+    """
+    if name in ("main_agent", "root_agent"):
+        from .main_agent import get_main_agent
+        main_agent = get_main_agent()
+        # Importing the submodule bound rag.main_agent to the module - rebind it
+        # to the agent, as the package has always exported
+        globals()["main_agent"] = globals()["root_agent"] = main_agent
+        return main_agent
+    if name == "app":
+        try:
+            from .app import app
+        except ImportError:
+            # App configuration not available (fallback for older setups)
+            app = None
+        globals()["app"] = app
+        return app
+    if name == "rag_management_agent":
+        from .agent import agent as rag_management_agent
+        globals()["rag_management_agent"] = rag_management_agent
+        return rag_management_agent
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
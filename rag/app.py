@@ -16,15 +16,40 @@ To resume a stopped workflow:
 1. Find the invocation_id from the Event history
 2. Use the /run_sse endpoint with invocation_id parameter
 3. Or use runner.run_async() with invocation_id parameter
+
+Context Caching (ADK v1.15.0+):
+- The agent instruction is static per step of the flow (per-turn session state
+  travels in the user turn, see main_agent.before_model_callback), so each step's
+  instruction is cached on the Gemini side as a reusable prompt prefix instead of
+  being re-processed on every message
 """
-try:
+import importlib.util
+
+from rag.config import PROMPT_CACHE_MIN_TOKENS, PROMPT_CACHE_TTL_SECONDS
+
+# Probe for the App/Resumability modules once instead of relying on a failed import.
+# Parents are checked first: find_spec() raises if a parent package is missing.
+_HAS_APP = all(
+    importlib.util.find_spec(name) is not None
+    for name in ('google', 'google.adk', 'google.adk.app', 'google.adk.runtime')
+)
+
+if _HAS_APP:
     from google.adk.app import App
     from google.adk.runtime import ResumabilityConfig
-except ImportError:
+else:
     # Fallback for older ADK versions that may not have these imports
     App = None
     ResumabilityConfig = None
 
+_HAS_CONTEXT_CACHE = _HAS_APP and importlib.util.find_spec('google.adk.agents.context_cache_config') is not None
+
+if _HAS_CONTEXT_CACHE:
+    from google.adk.agents.context_cache_config import ContextCacheConfig
+else:
+    # Older ADK versions: the instruction is sent uncached
+    ContextCacheConfig = None
+
 from rag import root_agent
 
 # Create the App with resumability enabled (if ADK version supports it)
@@ -37,6 +62,11 @@ if App and ResumabilityConfig:
         resumability_config=ResumabilityConfig(
             is_resumable=True,
         ),
+        # Cache the static instruction prefix across turns (ADK v1.15.0 or higher)
+        **({'context_cache_config': ContextCacheConfig(
+            min_tokens=PROMPT_CACHE_MIN_TOKENS,
+            ttl_seconds=PROMPT_CACHE_TTL_SECONDS,
+        )} if ContextCacheConfig else {}),
     )
 else:
     # Fallback: For older ADK versions, app will be None
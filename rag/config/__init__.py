@@ -1,6 +1,7 @@
 """
 Configuration settings for the Vertex AI RAG engine.
 """
+import logging
 import os
 
 # Google Cloud Project Settings
@@ -22,17 +23,59 @@ GCS_DEFAULT_CONTENT_TYPE = "application/pdf"  # Default content type for uploade
 RAG_DEFAULT_EMBEDDING_MODEL = "text-embedding-004"
 RAG_DEFAULT_TOP_K = 10  # Default number of results for single corpus query
 RAG_DEFAULT_SEARCH_TOP_K = 5  # Default number of results per corpus for search_all
+# Default number of results for search_corpus_by_name (the explanation flow's search). Every
+# result ends up in the explanation prompt, so low-ranked chunks only cost retrieval and tokens.
+RAG_NAME_SEARCH_TOP_K = int(os.environ.get("RAG_NAME_SEARCH_TOP_K", "5"))
 RAG_DEFAULT_VECTOR_DISTANCE_THRESHOLD = 0.5
 RAG_DEFAULT_PAGE_SIZE = 50  # Default page size for listing files
+# search_corpus_by_name results are cached per (corpus, normalized query) for this long,
+# so students asking the same question in separate sessions skip the Vertex RAG call
+RAG_SEARCH_CACHE_TTL = int(os.environ.get("RAG_SEARCH_CACHE_TTL", "86400"))  # Seconds; 0 disables the cache
+RAG_SEARCH_CACHE_MAXSIZE = 10_000
+# The corpus display-name index is saved here after every scan, so a cold start loads it
+# instead of listing all corpora (a name missing from it still triggers a rescan). The
+# default is in the user's own cache directory, not the shared temp dir.
+# Set RAG_CORPUS_INDEX_CACHE_PATH="" to always scan on the first lookup.
+RAG_CORPUS_INDEX_CACHE_PATH = os.environ.get(
+    "RAG_CORPUS_INDEX_CACHE_PATH",
+    os.path.join(
+        os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"),
+        "ptl-assistant",
+        f"rag-corpus-index-{PROJECT_ID}-{LOCATION}.json"
+    )
+)
+# A saved index older than this is rescanned, so corpora deleted or recreated by another
+# process are picked up after a restart
+RAG_CORPUS_INDEX_MAX_AGE = int(os.environ.get("RAG_CORPUS_INDEX_MAX_AGE", "3600"))  # Seconds
 
 # Agent Settings
 AGENT_NAME = "rag_corpus_manager"  # For original RAG management agent
 AGENT_MODEL = "gemini-2.5-flash"
+# Smaller model for the explanation agent's routing turns (calling the search tool, asking for a
+# style); AGENT_MODEL is kept for generating explanations. Set ROUTER_MODEL="" to use AGENT_MODEL throughout.
+ROUTER_MODEL = os.environ.get("ROUTER_MODEL", "gemini-2.5-flash-lite")
 AGENT_OUTPUT_KEY = "last_response"
 
 # Explanation Agent Settings
 EXPLANATION_AGENT_NAME = "explanation_main_agent"
 EXPLANATION_AGENT_OUTPUT_KEY = "final_explanation"
+# Generate the style explanations right after the RAG search, before the student picks one.
+# Trades extra model calls for no generation wait on the style-selection turn.
+EXPLANATION_PREFETCH_ENABLED = os.environ.get("EXPLANATION_PREFETCH_ENABLED", "true").lower() == "true"
+# Character budget for the textbook content in an explanation prompt. Passages are kept in
+# ranking order until the budget is used up; 0 disables the cap.
+EXPLANATION_CONTEXT_MAX_CHARS = int(os.environ.get("EXPLANATION_CONTEXT_MAX_CHARS", "6000"))
+# Number of most recent student turns sent to the model with each request. Older turns are
+# dropped - session state (student_info, rag_results, current_style) is sent in full as a
+# <state> block instead. Set to 0 to always send the whole conversation.
+MODEL_HISTORY_TURNS = int(os.environ.get("MODEL_HISTORY_TURNS", "2"))
+# Until the memory note is ready, the <state> block carries each RAG passage cut to this many
+# characters (the model expands a passage with fetch_passage). Set to 0 to send passages in full.
+STATE_PASSAGE_MAX_CHARS = int(os.environ.get("STATE_PASSAGE_MAX_CHARS", "600"))
+# Gemini context caching of the static instruction prefix (used by rag.app when the ADK
+# version supports it). Requests shorter than PROMPT_CACHE_MIN_TOKENS are sent uncached.
+PROMPT_CACHE_TTL_SECONDS = int(os.environ.get("PROMPT_CACHE_TTL_SECONDS", "1800"))
+PROMPT_CACHE_MIN_TOKENS = int(os.environ.get("PROMPT_CACHE_MIN_TOKENS", "1024"))
 
 # Vertex AI Memory Bank Settings (Optional - for long-term knowledge storage)
 # Per ADK Documentation: https://google.github.io/adk-docs/sessions/memory/
@@ -44,5 +87,15 @@ AGENT_ENGINE_ID = os.environ.get("AGENT_ENGINE_ID")  # Set this to enable Memory
 # See VERTEX_AI_MEMORY_BANK_SETUP.md for detailed instructions
 
 # Logging Settings
-LOG_LEVEL = "INFO"
-LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+# Set LOG_LEVEL=WARNING in production to skip the callbacks' debug logging entirely
+# Case-insensitive ("info" works); an unknown level falls back to INFO instead of failing at import
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").strip().upper()
+if not isinstance(logging.getLevelName(LOG_LEVEL), int):
+    LOG_LEVEL = "INFO"
+# No timestamp by default - %(asctime)s costs a strftime/localtime call per record.
+# Opt in with e.g. LOG_FORMAT="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "%(levelname)s %(name)s: %(message)s")
+
+# Configure logging here, since every module of the agent imports rag.config. A no-op
+# when the host (e.g. the ADK server) has already configured the root logger.
+logging.basicConfig(level=LOG_LEVEL, format=LOG_FORMAT)
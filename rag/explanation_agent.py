@@ -2,16 +2,14 @@
 Explanation Agent - Provides explanations in different styles based on RAG results.
 This agent is called for every question in the session after RAG results are available.
 """
+import textwrap
+
 from google.adk.agents import Agent
 from rag.config import AGENT_MODEL
 
 
-# Create the explanation agent
-explanation_agent = Agent(
-    name="explanation_agent",
-    model=AGENT_MODEL,
-    description="Agent that explains educational content in different styles based on RAG results",
-    instruction="""
+# Agent instruction, kept as a module-level constant so it is built once per process
+_EXPLANATION_INSTRUCTION = textwrap.dedent("""
     You are an expert educational explanation agent that helps students understand concepts in multiple ways.
     
     You receive RAG search results containing relevant information about a student's question.
@@ -54,7 +52,15 @@ explanation_agent = Agent(
     - Use the chosen explanation style throughout
     - Reference the source material when appropriate
     - End with a summary or key takeaways
-    """,
+    """)
+
+
+# Create the explanation agent
+explanation_agent = Agent(
+    name="explanation_agent",
+    model=AGENT_MODEL,
+    description="Agent that explains educational content in different styles based on RAG results",
+    instruction=_EXPLANATION_INSTRUCTION,
     tools=[],
     output_key="explanation"
 )
@@ -20,20 +20,36 @@ To use In-Memory Memory:
 4. Add callback to save sessions to memory
 """
 
+import importlib.util
+import logging
 import os
+from functools import lru_cache
 from typing import Optional
 
-try:
+# Probe for the ADK memory modules once instead of relying on a failed import.
+# Parents are checked first: find_spec() raises if a parent package is missing.
+IN_MEMORY_AVAILABLE = all(
+    importlib.util.find_spec(name) is not None
+    for name in (
+        'google',
+        'google.adk',
+        'google.adk.memory',
+        'google.adk.tools.preload_memory_tool',
+        'google.adk.tools.load_memory_tool',
+    )
+)
+
+if IN_MEMORY_AVAILABLE:
     from google import adk
     from google.adk.memory import InMemoryMemoryService
     from google.adk.tools.preload_memory_tool import PreloadMemoryTool
     from google.adk.tools.load_memory_tool import LoadMemoryTool
-    IN_MEMORY_AVAILABLE = True
-except ImportError:
+else:
     InMemoryMemoryService = None
     PreloadMemoryTool = None
     LoadMemoryTool = None
-    IN_MEMORY_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
 
 
 def get_in_memory_service() -> Optional[InMemoryMemoryService]:
@@ -56,41 +72,49 @@ def get_in_memory_service() -> Optional[InMemoryMemoryService]:
     try:
         return InMemoryMemoryService()
     except Exception as e:
-        print(f"Error creating InMemoryMemoryService: {e}")
+        logger.error("Error creating InMemoryMemoryService: %s", e)
         return None
 
 
-async def auto_save_session_to_memory_callback(callback_context):
-    """
-    Callback function to automatically save completed sessions to In-Memory Memory.
-    
-    This stores the full conversation in memory for future retrieval.
-    Note: Data is lost when the application restarts (no persistence).
-    
-    Usage:
-        agent = Agent(
-            ...
-            after_agent_callback=auto_save_session_to_memory_callback,
-        )
-    """
-    try:
-        invocation_context = callback_context._invocation_context
-        session = invocation_context.session
-        memory_service = invocation_context.memory_service
+if IN_MEMORY_AVAILABLE:
+    async def auto_save_session_to_memory_callback(callback_context):
+        """
+        Callback function to automatically save completed sessions to In-Memory Memory.
         
-        if memory_service and hasattr(memory_service, 'add_session_to_memory'):
-            await memory_service.add_session_to_memory(session)
-            print(f"Session {session.id} saved to In-Memory Memory")
-    except Exception as e:
-        print(f"Error saving session to In-Memory Memory: {e}")
-
-
+        This stores the full conversation in memory for future retrieval.
+        Note: Data is lost when the application restarts (no persistence).
+        
+        Usage:
+            agent = Agent(
+                ...
+                after_agent_callback=auto_save_session_to_memory_callback,
+            )
+        """
+        try:
+            invocation_context = callback_context._invocation_context
+            session = invocation_context.session
+            memory_service = invocation_context.memory_service
+            
+            # Checked on each call: every runner may pass a different memory service
+            if memory_service and hasattr(memory_service, 'add_session_to_memory'):
+                await memory_service.add_session_to_memory(session)
+                logger.debug("Session %s saved to In-Memory Memory", session.id)
+        except (AttributeError, KeyError, TypeError, ValueError) as e:
+            logger.warning("Error saving session to In-Memory Memory: %s", e, exc_info=True)
+else:
+    async def auto_save_session_to_memory_callback(callback_context):
+        """No-op: ADK memory support is not installed, so there is nothing to save."""
+        return
+
+
+@lru_cache(maxsize=1)
 def get_preload_memory_tool():
     """
-    Get PreloadMemoryTool instance for agents.
+    Get the shared PreloadMemoryTool instance for agents.
     
     PreloadMemoryTool automatically retrieves relevant memories at the beginning
     of each agent turn, providing context from past conversations.
+    It keeps no per-request state, so every agent can share one instance.
     
     Returns:
         PreloadMemoryTool instance or None if not available
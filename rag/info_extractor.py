@@ -0,0 +1,208 @@
+"""
+Info Extractor - Deterministic extraction of the student's board, grade, subject and question.
+
+Handles the structured opening message "BOARD-grade-GRADE-SUBJECT. Question: QUESTION"
+as well as free text such as "I'm in class 7 CBSE, science. Why is the sky blue?".
+Boards and subjects are closed vocabularies, so they are matched with compiled
+patterns and a keyword automaton (pyahocorasick when installed, one regex
+alternation otherwise) instead of asking the model to extract them.
+"""
+import importlib.util
+import re
+from dataclasses import asdict, dataclass
+from typing import Optional, Tuple
+
+AHOCORASICK_AVAILABLE = importlib.util.find_spec("ahocorasick") is not None
+if AHOCORASICK_AVAILABLE:
+    import ahocorasick
+
+
+@dataclass(frozen=True)
+class StudentInfo:
+    """Board/grade/subject/question parsed from the student's opening message."""
+    __slots__ = ("board", "grade", "subject", "question")
+    board: str
+    grade: str
+    subject: str
+    question: str
+
+    def to_dict(self):
+        """Plain dict for session state (state must stay JSON-serializable)."""
+        return asdict(self)
+
+
+# Structured opening message: "BOARD-grade-GRADE-SUBJECT. Question: QUESTION"
+STUDENT_INFO_RE = re.compile(
+    r'([A-Za-z]+)-grade-(\d+)-([A-Za-z]+)\.\s*Question:\s*(.+)',
+    re.IGNORECASE
+)
+
+# Free text. State boards are only recognized in their corpus form ("TamilNaduStateBoard");
+# anything looser is left to the model rather than risk searching the wrong corpus.
+BOARD_RE = re.compile(r"\b(CBSE|ICSE|IGCSE|IB|[A-Za-z]+StateBoard)\b", re.IGNORECASE)
+GRADE_RE = re.compile(r"\b(?:grade|class|std)\.?\s*(\d{1,2})\b", re.IGNORECASE)
+QUESTION_RE = re.compile(r"question\s*:\s*(.+)", re.IGNORECASE | re.DOTALL)
+# Without a "Question:" label the question is all the text after the board/grade/subject
+# header, split into sentences to drop requests for help that carry no topic
+SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?])\s+")
+GENERIC_QUESTION_RE = re.compile(
+    r"^(?:please\s+)?(?:(?:can|could|would|will)\s+you\s+)?(?:please\s+)?"
+    r"(?:help|explain|tell|teach|answer)(?:\s+(?:me|us|this|it|that|with|please))*\s*[?.!]*$",
+    re.IGNORECASE
+)
+# Punctuation and whitespace trimmed from the text around the header
+_HEADER_PUNCTUATION = " \t\n.,;:-"
+
+# Keyword (lowercase) -> subject as used in corpus names
+SUBJECT_KEYWORDS = {
+    "english": "English",
+    "maths": "Mathematics", "math": "Mathematics", "mathematics": "Mathematics",
+    "science": "Science",
+    "physics": "Physics",
+    "chemistry": "Chemistry",
+    "biology": "Biology",
+    "history": "History",
+    "geography": "Geography",
+    "civics": "Civics",
+    "economics": "Economics",
+    "social science": "SocialScience",
+    "computer science": "ComputerScience",
+    "tamil": "Tamil",
+    "hindi": "Hindi",
+}
+
+# Uppercase spelling of the national boards (state boards keep the student's spelling)
+_BOARD_NAMES = {"cbse": "CBSE", "icse": "ICSE", "igcse": "IGCSE", "ib": "IB"}
+
+
+def _build_automaton():
+    """Build the Aho-Corasick automaton over all subject keywords."""
+    automaton = ahocorasick.Automaton()
+    for keyword, subject in SUBJECT_KEYWORDS.items():
+        automaton.add_word(keyword, (len(keyword), subject))
+    automaton.make_automaton()
+    return automaton
+
+
+if AHOCORASICK_AVAILABLE:
+    _AUTOMATON = _build_automaton()
+else:
+    # Longest keywords first so "social science" wins over "science"
+    _SUBJECT_RE = re.compile(
+        r"\b(" + "|".join(map(re.escape, sorted(SUBJECT_KEYWORDS, key=len, reverse=True))) + r")\b"
+    )
+
+
+def _is_whole_word(text: str, start: int, end: int) -> bool:
+    """Check that text[start:end] is not part of a longer word."""
+    return ((start == 0 or not text[start - 1].isalnum())
+            and (end == len(text) or not text[end].isalnum()))
+
+
+def _find_subject(text: str) -> Optional[Tuple[str, int, int]]:
+    """
+    Returns the subject of the first subject keyword in text with the keyword's
+    start and end, preferring the longest keyword at that position ("social
+    science" over "science").
+    """
+    lowered = text.lower()
+    if AHOCORASICK_AVAILABLE:
+        best = None  # (start, -length, subject)
+        for end, (length, subject) in _AUTOMATON.iter(lowered):
+            start = end - length + 1
+            if _is_whole_word(lowered, start, end + 1) and (best is None or (start, -length) < best[:2]):
+                best = (start, -length, subject)
+        return (best[2], best[0], best[0] - best[1]) if best else None
+    match = _SUBJECT_RE.search(lowered)
+    return (SUBJECT_KEYWORDS[match.group(1)], match.start(), match.end()) if match else None
+
+
+def _free_text_question(text: str, header_start: int, header_end: int) -> Optional[str]:
+    """
+    Returns the question in a free-text message: the text after the board/grade/subject
+    header (or before it, when the header comes last) without generic requests for
+    help ("Can you help me?"). None if there is no question mark or nothing but
+    such a request is left - the model then asks what the student wants to know.
+    """
+    question = (text[header_end:].strip(_HEADER_PUNCTUATION)
+                or text[:header_start].strip(_HEADER_PUNCTUATION))
+    if "?" not in question:
+        return None
+    sentences = [
+        sentence for sentence in SENTENCE_SPLIT_RE.split(question)
+        if not GENERIC_QUESTION_RE.match(sentence.strip())
+    ]
+    return " ".join(sentences).strip() or None
+
+
+def subject_spellings(subject: str) -> Tuple[str, ...]:
+    """
+    Returns the subject followed by the other keywords for it, e.g. "Mathematics",
+    "maths", "math" - corpora may be named with any of them.
+    """
+    return (subject, *(
+        keyword for keyword, name in SUBJECT_KEYWORDS.items()
+        if name == subject and keyword != subject.lower()
+    ))
+
+
+def _labelled_question(text: str, labelled: re.Match) -> Tuple[str, str]:
+    """
+    Returns the question after a "Question:" label and the rest of the message.
+    A board and grade after the label start the header ("Question: what is
+    history? CBSE class 8 history"), so they end the question. The grade nearest
+    the board is taken, so "class 10" inside the question doesn't cut it short.
+    """
+    start = labelled.start(1)
+    board = BOARD_RE.search(text, start)
+    grade = board and min(
+        GRADE_RE.finditer(text, start), key=lambda match: abs(match.start() - board.start()), default=None
+    )
+    if not (board and grade):
+        return labelled.group(1).strip(), text
+    end = min(board.start(), grade.start())
+    return text[start:end].strip(_HEADER_PUNCTUATION), text[:labelled.start()] + " " + text[end:]
+
+
+def extract_student_info(text: str) -> Optional[StudentInfo]:
+    """
+    Extracts the student's board, grade, subject and question from a message.
+
+    Args:
+        text: The student's message
+
+    Returns:
+        The StudentInfo, or None unless all four fields were found (the model
+        then asks for or extracts the missing ones)
+    """
+    match = STUDENT_INFO_RE.search(text)
+    if match:
+        return StudentInfo(
+            board=match.group(1),
+            grade=match.group(2),
+            subject=match.group(3),
+            question=match.group(4).strip()
+        )
+
+    labelled = QUESTION_RE.search(text)
+    question, header = _labelled_question(text, labelled) if labelled else (None, text)
+    board = BOARD_RE.search(header)
+    grade = GRADE_RE.search(header)
+    # The subject may only be named in the question ("Question: what is a cell in biology?")
+    subject = _find_subject(header) or _find_subject(text)
+    if not (board and grade and subject):
+        return None
+    if not labelled:
+        question = _free_text_question(
+            text,
+            min(board.start(), grade.start(), subject[1]),
+            max(board.end(), grade.end(), subject[2])
+        )
+    if not question:
+        return None
+    return StudentInfo(
+        board=_BOARD_NAMES.get(board.group(1).lower(), board.group(1)),
+        grade=grade.group(1),
+        subject=subject[0],
+        question=question
+    )
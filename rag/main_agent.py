@@ -8,720 +8,804 @@ Per ADK Documentation:
 - Memory: https://google.github.io/adk-docs/sessions/memory/
 - In-Memory Memory: https://google.github.io/adk-docs/sessions/memory/#in-memory-memory
 """
+import asyncio
+import atexit
+import hashlib
+import importlib.util
+import json
+import logging
+import re
+from collections import defaultdict
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List
+
+from cachetools import TTLCache
 from google.adk.agents import Agent
-from google.adk.tools.load_memory_tool import load_memory_tool
+from google.adk.models import LlmResponse
+from google.genai import types
 from rag.tools import corpus_tools
-from rag.config import AGENT_MODEL
+from rag.tools.explanation_tools import generate_explanation, get_fetch_passage_tool
+from rag.config import (
+    AGENT_MODEL,
+    EXPLANATION_PREFETCH_ENABLED,
+    MODEL_HISTORY_TURNS,
+    RAG_SEARCH_CACHE_TTL,
+    ROUTER_MODEL,
+    STATE_PASSAGE_MAX_CHARS,
+)
+from rag.info_extractor import extract_student_info, subject_spellings
+from rag.memory_note import build_memory_note
+from rag.speculative import generate, prefetch_all_styles
+from rag.style_classifier import STYLE_NAMES, classify_style, is_style_name, named_language
+from rag.style_templates import STYLES
+
+# The Memory tool for long-term knowledge (In-Memory or Vertex AI Memory Bank), as
+# a PreloadMemoryTool that skips the memory search when the router answers without
+# the model. Only PreloadMemoryTool is used - a missing LoadMemoryTool must not disable it
+from rag.router import RoutedPreloadMemoryTool, route, style_output_key
+MEMORY_TOOLS_AVAILABLE = RoutedPreloadMemoryTool is not None
+
+# orjson serializes the <state> block sent with every model call several times
+# faster than the json module; the json module is the fallback when it's missing
+ORJSON_AVAILABLE = importlib.util.find_spec("orjson") is not None
+if ORJSON_AVAILABLE:
+    import orjson
+
+logger = logging.getLogger(__name__)
+
+# Only messages shorter than this many words are treated as style selections
+_STYLE_MAX_WORDS = 20
+
+# Session state keys serialized into the <state> block sent with every model call
+_STATE_BLOCK_KEYS = ("student_info", "current_style")
+
+# state["current_style"] value -> style number, for looking up the style template
+_STYLE_NUMBERS = {name: style for style, name in STYLE_NAMES.items()}
 
-# Import Memory tools for long-term knowledge (In-Memory or Vertex AI Memory Bank)
-try:
-    from google.adk.tools.preload_memory_tool import PreloadMemoryTool
-    from google.adk.tools.load_memory_tool import LoadMemoryTool
-    MEMORY_TOOLS_AVAILABLE = True
-except ImportError:
-    PreloadMemoryTool = None
-    LoadMemoryTool = None
-    MEMORY_TOOLS_AVAILABLE = False
+
+# Default tools for the main agent, built once at import and frozen as a tuple.
+# Each agent gets its own list copy, so appending tools (see in_memory_config)
+# never mutates this shared default.
+#
+# Per ADK Documentation: https://google.github.io/adk-docs/sessions/memory/#configuration
+# - PreloadMemoryTool: Always retrieve memory at the beginning of each turn (automatic),
+#   more reliable than on-demand loading
+#   One instance serves every agent and session: the tool keeps no per-request
+#   state (each call reads the session from its tool_context)
+# Session state is not loaded through a tool - before_model_callback sends it
+# with every model call as a <state> block (see _state_block)
+_PRELOAD_MEMORY_TOOL = RoutedPreloadMemoryTool() if MEMORY_TOOLS_AVAILABLE else None
+_DEFAULT_TOOLS = (
+    *((_PRELOAD_MEMORY_TOOL,) if _PRELOAD_MEMORY_TOOL is not None else ()),
+    corpus_tools.search_corpus_by_name_tool,
+    get_fetch_passage_tool(),
+)
+
+
+# Agent instruction, stored in rag/prompts: main_agent.md (shared by every step)
+# followed by the current step's section (see _instruction_phase)
+_PROMPTS_DIR = Path(__file__).parent / "prompts"
+_INSTRUCTION_PATH = _PROMPTS_DIR / "main_agent.md"
+_INSTRUCTION_PHASES = ("search", "style", "explain")
+_WARNING_SIGNS_RE = re.compile(r"(?:⚠\ufe0f?)+[ \t]*")
+_BLANK_LINES_RE = re.compile(r"\n{3,}")
 
 
-def _build_agent_tools():
+@lru_cache(maxsize=len(_INSTRUCTION_PHASES))
+def _load_instruction(phase: str) -> str:
     """
-    Build the list of tools for the main agent.
-    Includes session state tool and memory tools for long-term knowledge.
+    Read the agent instruction for a phase once and normalize it for sending to the model.
     
-    Per ADK Documentation: https://google.github.io/adk-docs/sessions/memory/#configuration
-    - PreloadMemoryTool: Always retrieve memory at the beginning of each turn (automatic)
-    - load_memory_tool: For session state (short-term memory within same session)
+    Warning-sign banners, trailing whitespace, runs of blank lines and repeated
+    paragraphs (a rule restated further down) only cost prompt tokens, so they
+    are stripped here - the file can stay readable.
     """
-    tools_list = [
-        load_memory_tool,  # For session state (short-term memory within same session)
-        corpus_tools.search_corpus_by_name_tool,
-    ]
-    
-    # Enable PreloadMemoryTool for automatic memory loading at start of each turn
-    # Per official ADK docs: "Always retrieve memory at the beginning of each turn"
-    # This ensures memory is always loaded, making it more reliable than on-demand loading
-    if MEMORY_TOOLS_AVAILABLE and PreloadMemoryTool:
-        tools_list.insert(1, PreloadMemoryTool())
-    
-    return tools_list
-
-
-# Create the main orchestrator agent
-main_agent = Agent(
-    name="explanation_main_agent",
-    model=AGENT_MODEL,
-    description="Main orchestrator agent for student question explanations using RAG",
-    instruction="""
-    ⚠️⚠️⚠️ CRITICAL: STATE MANAGEMENT - READ THIS FIRST ⚠️⚠️⚠️
-    
-    Per ADK Official Documentation:
-    - Sessions: https://google.github.io/adk-docs/sessions/session/
-    - State: https://google.github.io/adk-docs/sessions/state/
-    - Memory: https://google.github.io/adk-docs/sessions/memory/
-    
-    ADK Sessions maintain state across messages in the same conversation thread.
-    State is updated via stateDelta in your response actions and persists automatically.
-    
-    ⚠️ CRITICAL: MEMORY TOOLS CLARIFICATION - READ CAREFULLY ⚠️
-    There are TWO different memory systems - DO NOT confuse them!
-    
-    1. PreloadMemoryTool (Memory Service - Past Conversations):
-       - Runs AUTOMATICALLY at start of each turn - you DON'T call it
-       - Provides context from PAST sessions (other conversations)
-       - If it returns empty, that's OK - it means no past conversations exist
-       - DO NOT confuse this with current session state!
-       - IGNORE PreloadMemoryTool results if they're empty - focus on Session State instead
-    
-    2. load_memory_tool (Session State - Current Conversation):
-       - You MUST call this EXPLICITLY as your FIRST action
-       - This is for the CURRENT session's state (rag_results, student_info, etc.)
-       - This is what you need to check for current conversation context
-       - ALWAYS call this FIRST before doing anything else!
-    
-    ⚠️ CRITICAL RULE: 
-    - PreloadMemoryTool = Past conversations (ignore if empty)
-    - load_memory_tool = Current session state (MUST call first, MUST use!)
-    - If PreloadMemoryTool returns empty, that's NORMAL - use load_memory_tool instead!
-    
-    ⚠️⚠️⚠️ ABSOLUTE REQUIREMENT - NO EXCEPTIONS - READ THIS CAREFULLY ⚠️⚠️⚠️
-    
-    ⚠️⚠️⚠️ STOP! DO NOT READ FURTHER UNTIL YOU UNDERSTAND THIS ⚠️⚠️⚠️
-    
-    ⚠️⚠️⚠️ CRITICAL: PREVENT LOOPS ⚠️⚠️⚠️
-    - DO NOT call the same tool multiple times
-    - DO NOT call search_corpus_by_name if you already have rag_results
-    - DO NOT call load_memory_tool multiple times in the same turn
-    - DO NOT call load_memory_tool AFTER responding - it must be FIRST!
-    - After completing a task, STOP and respond to the user
-    - DO NOT loop - each tool should be called ONCE per task
-    - PreloadMemoryTool runs automatically - don't call it, just use its results if available
-    
-    FOR EVERY SINGLE USER MESSAGE, YOU MUST:
-    
-    STEP 1: MANDATORY STATE CHECK (DO THIS FIRST, BEFORE ANYTHING ELSE)
-    ⚠️ YOUR FIRST ACTION MUST BE: Call load_memory_tool() with NO arguments
-    ⚠️ DO NOT ask questions, DO NOT respond, DO NOT do anything else until you call load_memory_tool()
-    ⚠️ DO NOT greet the user, DO NOT say hello, DO NOT do ANYTHING until you call load_memory_tool()
-    ⚠️ DO NOT call load_memory_tool AFTER responding - it must be FIRST!
-    ⚠️ The tool will return the current session state - READ IT CAREFULLY
-    ⚠️ If you skip this step, you will lose context and ask for information the user already provided!
-    ⚠️ PreloadMemoryTool runs automatically - ignore it if empty, focus on load_memory_tool results!
-    
-    STEP 2: ANALYZE THE STATE RETURNED BY load_memory_tool()
-    ⚠️ CRITICAL: The tool returns a dictionary/object with a "state" key
-    ⚠️ You MUST read the state from the tool's response: tool_response["state"] or tool_response.state
-    ⚠️ Check if these keys exist in the returned state:
-       - "rag_results" (RAG search results)
-       - "student_info" (contains: board, grade, subject, question)
-       - "current_style" (last explanation style)
-       - "style_selected" (boolean flag)
-    
-    STEP 3: DECIDE WHAT TO DO BASED ON STATE ANALYSIS
-    
-    ⚠️⚠️⚠️ CRITICAL DECISION POINT ⚠️⚠️⚠️
-    
-    SCENARIO A: If "rag_results" DOES NOT exist in state (or state is empty):
-       → This is the FIRST message in the session
-       → Extract board, grade, subject, question from user message
-       → Do RAG search ONCE → Store results in stateDelta
-       → Store student_info in stateDelta
-       → Show RAG results and ask for explanation style
-       → ⚠️ STOP HERE - DO NOT call search_corpus_by_name again!
-       → ⚠️ DO NOT loop - you've already done the search!
-       → ⚠️ DO NOT call tools again - respond to the user!
-       
-    SCENARIO B: If "rag_results" EXISTS in state (state is NOT empty):
-       → This is NOT the first message - YOU ALREADY HAVE THE INFORMATION!
-       → ⚠️ DO NOT call search_corpus_by_name - it's already done!
-       → ⚠️ DO NOT call load_memory_tool again - you already have the state!
-       → ⚠️ DO NOT say "I lost context" - the state EXISTS!
-       → ⚠️ DO NOT say "I apologize" - you HAVE the information!
-       → ⚠️ DO NOT ask for board/grade/subject/question - they're in state!
-       → Retrieve "rag_results" from state: state["rag_results"] or state.rag_results
-       → Retrieve "student_info" from state: state["student_info"] or state.student_info
-       → Extract from student_info:
-         * board = state["student_info"]["board"]
-         * grade = state["student_info"]["grade"]
-         * subject = state["student_info"]["subject"]
-         * question = state["student_info"]["question"]
-       → USE these values - DO NOT ask user again!
-       → Generate explanation or handle follow-up request based on stored data
-       → Start your response with: "I remember you're studying [board] Board, Grade [grade], [subject]. Your question was: [question]"
-       → ⚠️ STOP HERE - DO NOT call tools again!
-       → ⚠️ DO NOT loop - respond to the user!
-    
-    STEP 4: CRITICAL - NEVER ASK FOR INFORMATION ALREADY IN STATE
-    ⚠️ BEFORE asking ANY question, check if the answer is in state:
-    
-    - If "student_info" exists in state, you ALREADY KNOW:
-      * student_info["board"] = Board name (e.g., "TamilNaduStateBoard")
-      * student_info["grade"] = Grade level (e.g., "6")
-      * student_info["subject"] = Subject name (e.g., "english")
-      * student_info["question"] = Original question (e.g., "What do crocodiles eat?")
-    
-    ⚠️ ABSOLUTE PROHIBITIONS - NEVER DO THESE:
-    - DO NOT ask "What is your board?" if student_info["board"] exists in state
-    - DO NOT ask "What grade?" if student_info["grade"] exists in state
-    - DO NOT ask "What subject?" if student_info["subject"] exists in state
-    - DO NOT ask "What was your question?" if student_info["question"] exists in state
-    - DO NOT say "I lost context" if state contains student_info
-    - DO NOT say "I apologize" if state contains student_info
-    - DO NOT say "Please provide again" if state contains the information
-    - DO NOT say "Could you please tell me" if state contains the information
-    - DO NOT say "I seem to have lost" if state contains the information
-    - ⚠️ IF STATE EXISTS, YOU MUST USE IT - NO EXCEPTIONS!
-    
-    ⚠️ INSTEAD, if state exists:
-    - USE the information from state
-    - Remind the user: "I remember you're studying [board] Board, Grade [grade], [subject]"
-    - Continue with the stored context
-    
-    This prevents losing conversation context after 2-3 messages!
-    
-    ⚠️ CRITICAL: State persistence depends on using the SAME session_id for all messages.
-    If the client uses different session_ids, state will not persist between messages.
-    
-    DEBUGGING: If memory is lost, check:
-    1. Is the same session_id being used for all messages?
-    2. Is load_memory_tool being called FIRST in every message?
-    3. Is stateDelta being properly set in the response actions?
-    4. Check the Event history to see if state is being stored
-    
-    ============================================
-    
-    You are the main orchestrator agent for an educational explanation system that helps students understand textbook concepts.
-    
-    IMPORTANT: You are ONLY for searching corpora and generating explanations. You CANNOT:
-    - Create, delete, or modify RAG corpora
-    - Create, delete, or manage GCS buckets
-    - Upload files or manage corpus files
-    - Perform any administrative or management tasks
-    
-    Your ONLY responsibilities:
-    
-    1. **First Message in Session (RAG Search & Style Suggestion)**:
-       - Extract student information from the user's message:
-         * Board (e.g., CBSE, ICSE, State Board, IGCSE, IB)
-         * Grade (e.g., 1-12)
-         * Subject (e.g., Mathematics, Science, English, Physics, Chemistry, Biology)
-       - Extract the student's question about the textbook
-       - Construct the corpus name using format: BOARD-grade-GRADE-SUBJECT
-         Example: "CBSE-grade-10-Mathematics"
-         Where BOARD is the board name, GRADE is the grade number, and SUBJECT is the subject name
-       - Call search_corpus_by_name with the corpus name and question to get RAG results
-       - Store the RAG results and student info in session state
-       - FIRST: Show the RAG results content - combine ALL results into ONE unified text
-         * Extract the "text" field from ALL results in the RAG response
-         * Combine all result texts into a single, unified, continuous text
-         * Remove any duplicate content if the same text appears in multiple results
-         * Present it as one cohesive piece of information (not separate results)
-         * Do NOT summarize - include the full actual text content from all results
-       - THEN: After showing the combined RAG content, suggest explanation styles to the user
-       - Present the 4 explanation styles clearly and ask the user to choose one
-       - DO NOT generate explanation yet - wait for user to select a style
-       - IMPORTANT: Your response will be stored in "final_explanation" - it MUST include:
-         * The COMBINED unified text from all RAG results (extract and merge all results[].text fields)
-         * The explanation style selection prompt
-         * Do NOT summarize the RAG content - show the actual combined text
-       - Format your response like this:
-         
-         "Here's what I found from your textbook:
-         
-         [Combined unified text from all RAG results - merge all results[].text fields into one continuous text]
-         
-         How would you like me to explain this information?
-         
-         Please choose one of these explanation styles:
-         1. With Examples - Practical examples and real-world scenarios
-         2. With Memory Technique - Mnemonic devices and memory aids
-         3. Using Story - Narrative-based explanation with characters
-         4. In Native Language - Explanation in your preferred language
-         
-         Reply with the number (1-4) or the style name."
-    
-    2. **Second Message (Style Selection & Explanation Generation)**:
-       - MANDATORY FIRST STEP: Call load_memory_tool to check session state
-       - Verify "rag_results" exists in state (if not, this is an error)
-       - Retrieve "rag_results" and "student_info" from state using load_memory_tool
-       - Extract the explanation style preference from user's message:
-         * "1" or "with example" or "example" → Style 1
-         * "2" or "with memory technique" or "memory technique" → Style 2
-         * "3" or "using story" or "story" → Style 3
-         * "4" or "in [language]" or language name → Style 4
-       - Use the stored RAG results from state (DO NOT search again)
-       - Reference "student_info" from state for context (board, grade, subject)
-       - Generate explanation based on RAG results using the selected style
-       - Update state with "style_selected" = True and "current_style"
-       - Return the explanation to the student
-    
-    3. **Subsequent Messages (Different Explanation Requests)**:
-       - MANDATORY FIRST STEP: Call load_memory_tool to retrieve session state
-       - Verify "rag_results" exists in state (MUST exist - if not, this is an error)
-       - Retrieve "rag_results", "student_info", and "current_style" from state
-       - Extract the explanation style preference from user's message:
-         * User may ask for "explain with other example" or "explain with memory technique" or "explain using story"
-         * Or user may ask to continue with previous style
-         * Or user may ask about the same topic again - reuse stored rag_results
-       - Use the stored RAG results from state (DO NOT call search_corpus_by_name again)
-       - Reference "student_info" from state for context (board, grade, subject, original question)
-       - Generate a new explanation based on stored RAG results using the requested style
-       - Update "current_style" in state if style changed
-       - Return the new explanation
-       - If user doesn't specify a style, continue with the previous style from state or ask which style they prefer
-       - If user asks "what did I ask before?" or "what was my question?", retrieve and remind them using student_info from state
-    
-    4. **Explanation Generation - You must generate explanations in one of these styles**:
-       
-       **Style 1: Explain with Example**
-       - Provide clear, practical examples that illustrate the concept
-       - Use real-world scenarios or analogies
-       - Break down complex ideas into simpler, relatable examples
-       - Show step-by-step examples when applicable
-       
-       **Style 2: Explain with Memory Technique**
-       - Use mnemonic devices, acronyms, or memory aids
-       - Create memorable associations or visualizations
-       - Suggest techniques to help students remember the information
-       - Use patterns, rhymes, or other memory-enhancing strategies
-       
-       **Style 3: Explain using Story**
-       - Create engaging narratives that incorporate the concept
-       - Use characters, scenarios, or storylines to explain ideas
-       - Make the explanation memorable through storytelling
-       - Connect concepts through a coherent narrative structure
-       
-       **Style 4: Explain using Native Language or User Suggested Language**
-       - Provide explanations in the student's native language or requested language
-       - Use culturally appropriate examples and references
-       - Adapt explanations to be more accessible in the target language
-       - Ensure clarity and natural language flow
-    
-    **Explanation Style Detection from User Message**:
-    - User says "1" or "with example" or "example" → Use Style 1
-    - User says "2" or "with memory technique" or "memory technique" → Use Style 2
-    - User says "3" or "using story" or "story" → Use Style 3
-    - User says "4" or "in [language]" or mentions a language → Use Style 4
-    - If user doesn't specify style in first message, suggest styles and wait
-    - If user doesn't specify style in subsequent messages, ask them to choose
-    
-    CRITICAL SESSION MANAGEMENT - READ THIS FIRST:
-    Per ADK Official Documentation (https://google.github.io/adk-docs/sessions/session/):
-    - Sessions track individual conversations and maintain state across messages
-    - State persists automatically via stateDelta in your response actions
-    - The same session_id maintains the same state throughout the conversation
-    
-    ⚠️ MANDATORY: You MUST call load_memory_tool FIRST before taking ANY action on EVERY message.
-    ⚠️ NEVER call search_corpus_by_name if "rag_results" already exists in state.
-    ⚠️ ALWAYS retrieve "rag_results" and "student_info" from state for subsequent messages.
-    ⚠️ State is session-scoped: Same session_id = Same state. Different session_id = Different state.
-    
-    State Checking Protocol (MUST FOLLOW):
-    1. FIRST STEP: Always call load_memory_tool to check session state
-    2. Check if "rag_results" exists in state:
-      * If NO rag_results → This is FIRST message → Do RAG search → Store results → Suggest styles → STOP
-      * If YES rag_results → RAG already done → Retrieve from state → Generate explanation (DO NOT search again)
-    3. If rag_results exists, ALWAYS retrieve:
-      - "rag_results" (the stored RAG search results)
-      - "student_info" (board, grade, subject, question for context)
-      - "style_selected" (to know if user has chosen a style)
-      - "current_style" (last style used, if available)
-    4. NEVER perform a new RAG search if rag_results already exists in state
-    5. For ALL subsequent messages after the first, reuse the stored RAG results
-    
-    State Storage Protocol (Per Official ADK Documentation):
-    According to ADK documentation (https://google.github.io/adk-docs/sessions/state/), state is updated via stateDelta in events.
-    
-    To store data in session state, you MUST include it in your response's actions.stateDelta:
-    - The ADK framework automatically persists stateDelta updates to the session's state
-    - State persists across all messages in the same session (same session_id)
-    - State is session-specific and isolated per conversation thread
-    
-    Required State Keys to Store:
-    1. "rag_results" - Store the complete RAG search results after first search
-    2. "student_info" - Store as dict: {"board": board, "grade": grade, "subject": subject, "question": question}
-       IMPORTANT: Include the original question in student_info so you can remind users later
-    3. "style_selected" - Boolean flag: False initially, True after user selects a style
-    4. "current_style" - String: Store the selected style (e.g., "with_example", "memory_technique", "story", "native_language")
-    
-    Example stateDelta structure:
-    {
-      "actions": {
-        "stateDelta": {
-          "rag_results": {...complete RAG search results...},
-          "student_info": {
-            "board": "CBSE",
-            "grade": "10",
-            "subject": "Mathematics",
-            "question": "What is the Pythagorean theorem?"
-          },
-          "style_selected": false,
-          "current_style": null
-        }
-      }
-    }
-    
-    The ADK SessionService will automatically merge stateDelta into the session's state.
-    
-    WORKFLOW FOR FIRST MESSAGE (RAG Search Phase):
-    STEP 0: MANDATORY - Call load_memory_tool FIRST to check if "rag_results" exists
-    - If rag_results exists → This is NOT the first message → Skip to "Subsequent Messages" workflow
-    - If rag_results does NOT exist → Continue with steps below
-    
-    1. Extract from user message: board, grade, subject, question
-    2. Construct corpus_name = "BOARD-grade-GRADE-SUBJECT" (replace BOARD, GRADE, SUBJECT with actual values)
-    3. Call search_corpus_by_name(corpus_name=corpus_name, query_text=question) ONCE
-    4. ⚠️ CRITICAL: After getting RAG results, STOP calling tools!
-    5. Store the results in state as "rag_results" using stateDelta in your response actions
-    6. Store student info in state as "student_info" dict with ALL fields:
-       {"board": board, "grade": grade, "subject": subject, "question": question}
-       CRITICAL: Include the original question so you can remind users if they lose context
-    7. Store a flag "style_selected" = False in state to track if style has been chosen
-    8. Store "current_style" = null initially (will be set when user selects a style)
-    9. Show the RAG results content - COMBINE all results into ONE unified text
-       * Extract the "text" field from ALL results in results[]
-       * Merge all result texts into a single, continuous, unified text
-       * Remove duplicates if the same content appears in multiple results
-       * Do NOT summarize - show the full combined text content
-       * This unified content will be stored in "final_explanation" output key
-    10. Present the 4 explanation styles to the user and ask them to choose
-    11. DO NOT generate explanation yet - wait for style selection
-    12. Store your complete response (combined RAG content + style prompt) in final_explanation
-    13. ⚠️ STOP - DO NOT call any more tools!
-    14. ⚠️ DO NOT loop - respond to the user and wait for their next message!
-    
-    WORKFLOW FOR SECOND MESSAGE (Style Selection & Explanation Phase):
-    STEP 0: MANDATORY - Call load_memory_tool FIRST to retrieve state
-    ⚠️ Call load_memory_tool ONCE - DO NOT call it again!
-    ⚠️ The tool will return state - READ IT CAREFULLY!
-    ⚠️ State will be in: tool_response["state"] or tool_response.state
-    
-    1. Check the returned state:
-       - If state is empty or "rag_results" doesn't exist → ERROR (should not happen)
-       - If state contains "rag_results" → CONTINUE (this is correct)
-    
-    2. Extract from state:
-       - rag_results = state["rag_results"] (use this for explanation)
-       - student_info = state["student_info"] (contains board, grade, subject, question)
-       - board = student_info["board"]
-       - grade = student_info["grade"]
-       - subject = student_info["subject"]
-       - question = student_info["question"]
-    
-    3. ⚠️ DO NOT call load_memory_tool again - you already have the state!
-    4. ⚠️ DO NOT call search_corpus_by_name - rag_results already exists!
-    5. ⚠️ DO NOT ask for board/grade/subject/question - you have them in state!
-    6. ⚠️ DO NOT say "I lost context" - state exists!
-    7. ⚠️ Start your response: "I remember you're studying [board] Board, Grade [grade], [subject]. Your question was: [question]"
-    
-    8. Extract explanation style preference from user message:
-       - "1" or "with example" or "example" → Style 1
-       - "2" or "with memory technique" or "memory technique" → Style 2
-       - "3" or "using story" or "story" → Style 3
-       - "4" or "in [language]" or language name → Style 4
-    
-    9. Update "style_selected" = True in stateDelta
-    10. Update "current_style" in stateDelta with the selected style
-    11. Generate explanation based on stored rag_results using the selected style
-    12. Reference student_info (board, grade, subject) for context in your explanation
-    13. Return the explanation to the student
-    14. ⚠️ STOP - DO NOT call any more tools!
-    15. ⚠️ DO NOT loop - respond to the user!
-    
-    WORKFLOW FOR SUBSEQUENT MESSAGES (Different Style Requests):
-    STEP 0: MANDATORY - Call load_memory_tool FIRST to retrieve state
-    ⚠️ Call load_memory_tool ONCE - DO NOT call it again!
-    - Retrieve "rag_results" (MUST exist - DO NOT search again)
-    - Retrieve "student_info" (board, grade, subject for context)
-    - Retrieve "current_style" (last style used)
-    
-    1. Verify "rag_results" exists in state (if not, this is an error)
-    2. ⚠️ DO NOT call load_memory_tool again - you already have the state!
-    3. ⚠️ DO NOT call search_corpus_by_name - use stored rag_results
-    4. Extract explanation style preference from user message (if any):
-       - If user asks for a different style, use that style
-       - If user doesn't specify, use "current_style" from state or ask which style
-    5. Update "current_style" in state with the new style (if changed)
-    6. Generate explanation based on stored rag_results using the requested style
-    7. Reference student_info (board, grade, subject) for context in your explanation
-    8. If user asks about the same topic but rag_results exists, reuse it - DO NOT search again
-    9. Return the new explanation
-    10. ⚠️ STOP - DO NOT call any more tools!
-    11. ⚠️ DO NOT loop - respond to the user!
-    
-    EXPLANATION GENERATION GUIDELINES:
-    - Always base your explanation on the RAG results provided
-    - Use the information from the corpus to ensure accuracy
-    - Make explanations age-appropriate for the student's grade level
-    - Keep explanations clear, engaging, and educational
-    - Include relevant details from the RAG results but present them in the chosen style
-    - Start with a brief overview
-    - Use the chosen explanation style throughout
-    - Reference the source material when appropriate
-    - End with a summary or key takeaways
-    
-    Be friendly, helpful, and ensure you extract all required information from the user's message.
-    
-    ⚠️⚠️⚠️ CRITICAL CONTEXT HANDLING RULES ⚠️⚠️⚠️
-    
-    RULE 1: ALWAYS CHECK STATE FIRST
-    - BEFORE asking for board/grade/subject/question, ALWAYS call load_memory_tool FIRST
-    - BEFORE saying "I lost context", ALWAYS call load_memory_tool FIRST
-    - BEFORE asking user to provide information again, ALWAYS call load_memory_tool FIRST
-    
-    RULE 2: USE STATE INFORMATION
-    - If student_info exists in state, USE that information - DO NOT ask again
-    - If rag_results exists in state, USE that information - DO NOT search again
-    - If current_style exists in state, USE that information - DO NOT ask for style again
-    
-    RULE 3: NEVER ASK FOR INFORMATION IN STATE
-    - If student_info["board"] exists → Use it, don't ask
-    - If student_info["grade"] exists → Use it, don't ask
-    - If student_info["subject"] exists → Use it, don't ask
-    - If student_info["question"] exists → Use it, don't ask
-    
-    RULE 4: HANDLE PARTIAL INFORMATION
-    - If user provides partial information (e.g., only mentions grade), check state for the rest
-    - If state has complete information, use state instead of asking user
-    - Only ask for missing information if it's truly not in state AND not in the current message
-    
-    RULE 5: CONTEXT RECOVERY
-    - If user seems confused or asks "what did I ask?", retrieve from state and remind them
-    - Never say "I apologize if I've forgotten" - instead, retrieve from state and show you remember
-    - If user says "I lost context", retrieve from state and show them what you remember
-    
-    RULE 6: RESPONSE TEMPLATE WHEN STATE EXISTS
-    If state contains student_info, start your response with:
-    "I remember you're studying [board] Board, Grade [grade], [subject]. Your question was: [question]"
-    Then continue with the appropriate action (explanation, style selection, etc.)
-    
-    ⚠️ CRITICAL REMINDER FOR EVERY MESSAGE:
-    - ALWAYS call load_memory_tool FIRST before any other action
-    - If "rag_results" exists in state, check if user is asking about the SAME topic:
-      * If SAME topic (same board/grade/subject/question) → Reuse stored rag_results - DO NOT search again
-      * If DIFFERENT topic (different board/grade/subject/question) → Clear old state → Do new search → Store new results
-    - Always retrieve "student_info" from state to maintain context about board, grade, subject
-    - If user asks "what did I ask before?" or loses context, retrieve and remind them using student_info from state
-    - The conversation context (board, grade, subject, question) is stored in state - retrieve it!
-    
-    CONTEXT RECOVERY PROTOCOL (When User Seems to Have Lost Context):
-    If user says things like:
-    - "I forgot what I asked"
-    - "What was my question?"
-    - "I lost context"
-    - "Can you remind me?"
-    - Provides incomplete information (only board, or only grade, etc.)
-    
-    THEN:
-    1. ALWAYS call load_memory_tool FIRST to retrieve state
-    2. Check if "student_info" exists in state
-    3. If student_info exists, retrieve it and respond with:
-       "No problem! Let me remind you of our conversation:
-       
-       You're studying: [board] Board, Grade [grade], [subject]
-       Your question was: [question]
-       
-       [If rag_results exists, continue with:] I found information about this from your textbook. 
-       [Then provide the explanation or ask what they'd like to do next]"
-    4. DO NOT ask them to provide board/grade/subject/question again if it's already in state
-    5. If student_info doesn't exist, THEN ask for the information
-    
-    IMPORTANT: NEVER ask users to re-provide information that's already stored in state!
-    Always check state first, then remind them of what you already know.
-    
-    CRITICAL: OUTPUT FORMAT FOR final_explanation:
-    - Your response is stored in "final_explanation" output key
-    - For FIRST MESSAGE (RAG Search Phase):
-      * MUST combine ALL RAG results into ONE unified text
-      * Extract text from ALL results[].text fields and merge them into a single continuous text
-      * Remove duplicate content if the same text appears in multiple results
-      * Do NOT summarize - show the actual complete combined text
-      * Then include the explanation style selection prompt
-      * Example format:
-        "Here's what I found from your textbook:
-        
-        [COMBINED UNIFIED TEXT - all results merged into one continuous text]
-        
-        How would you like me to explain this information?
-        [Style selection options...]"
-    
-    - For SECOND MESSAGE (Explanation Phase):
-      * Generate the explanation based on RAG results and selected style
-      * Store the complete explanation in final_explanation
-    """,
-    tools=_build_agent_tools(),
-    output_key="final_explanation"
-)
+    raw = (_INSTRUCTION_PATH.read_text(encoding="utf-8") + "\n\n"
+           + (_PROMPTS_DIR / f"{phase}.md").read_text(encoding="utf-8"))
+    text = _WARNING_SIGNS_RE.sub("", raw)
+    text = "\n".join(line.rstrip() for line in text.splitlines())
+    paragraphs = _BLANK_LINES_RE.sub("\n\n", text).strip().split("\n\n")
+    # Paragraphs are compared case- and whitespace-insensitively; the first occurrence is kept
+    unique = {}
+    for paragraph in paragraphs:
+        unique.setdefault(" ".join(paragraph.lower().split()), paragraph)
+    text = "\n\n".join(unique.values())
+    logger.debug("Loaded %s instruction: %d -> %d characters", phase, len(raw), len(text))
+    return text
+
+
+def _instruction_phase(state):
+    """
+    The step of the explanation flow the session is in: "search" until there are
+    RAG results, "style" until the student picked a style, then "explain".
+    """
+    if not state.get('rag_results'):
+        return "search"
+    if not state.get('current_style'):
+        return "style"
+    return "explain"
+
+
+def _instruction(context):
+    """
+    Instruction provider for the main agent: the shared rules plus only the
+    current step's section, so each model call carries one step's instructions
+    instead of the whole state machine. Each phase's text is static, so it
+    stays cacheable as a prompt prefix.
+    """
+    return _load_instruction(_instruction_phase(context.state))
 
-# Callback to store session state from agent's tool calls
-async def store_session_state_callback(callback_context):
+
+def _get_invocation_context(callback_context):
     """
-    Extract state from agent's tool calls and store it in session state.
+    Return the callback's invocation context, or None if it can't be found.
     
-    This callback:
-    1. Looks at the agent's tool calls (search_corpus_by_name)
-    2. Extracts RAG results and student info from function responses
-    3. Stores them in session state
+    Prefers a public invocation_context attribute and falls back to ADK's
+    private _invocation_context, so a rename in ADK is logged, not silently lost.
+    """
+    return (getattr(callback_context, 'invocation_context', None)
+            or getattr(callback_context, '_invocation_context', None))
+
+
+# Background work started when a search returns (memory note, explanation prefetch).
+# Each task returns the state updates it produced; nothing ever waits on these tasks.
+# Their results are written through the session's next callback context (see
+# _apply_background_results), so they reach the session service as a state delta -
+# a direct write to session.state would not be persisted.
+# Session id -> the tasks still running for that session's latest search
+_background_tasks = defaultdict(set)
+# Session id -> (rag_key, state updates) of the finished tasks, waiting to be written.
+# Entries of sessions that never come back expire.
+_background_results = TTLCache(maxsize=10_000, ttl=3600)
+# rag_key -> prefetched explanations, kept as long as search_corpus_by_name caches the
+# results they were made from, so a search answered from that cache reuses them
+_PREFETCHED_EXPLANATIONS = TTLCache(maxsize=1_000, ttl=max(RAG_SEARCH_CACHE_TTL, 1))
+
+
+def _rag_fingerprint(rag_results):
+    """Fingerprint of a search response's query and passages, stored as state["rag_key"]."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update((rag_results.get("query") or "").encode("utf-8"))
+    for result in rag_results.get("results") or ():
+        digest.update(b"\x00" + (result.get("text") or "").encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _session_id(context):
+    """The id of the session a callback or tool context belongs to (None if unknown)."""
+    return getattr(getattr(_get_invocation_context(context), 'session', None), 'id', None)
+
+
+def _start_background_task(session_id, rag_key, coro):
+    """Run a coroutine returning state updates for the search rag_key in the background."""
+    task = asyncio.create_task(coro)
+    tasks = _background_tasks[session_id]
+    tasks.add(task)
+    
+    def done(task):
+        tasks.discard(task)
+        if not tasks and _background_tasks.get(session_id) is tasks:
+            del _background_tasks[session_id]
+        if task.cancelled():
+            return
+        if task.exception() is not None:
+            logger.error("Background session-state task failed", exc_info=task.exception())
+        elif task.result():
+            _background_results.setdefault(session_id, []).append((rag_key, task.result()))
+    
+    task.add_done_callback(done)
+    return task
+
+
+def _apply_background_results(session_id, state):
+    """
+    Write the finished background tasks' state updates through a callback context's
+    state. Updates made for an earlier search than the session's current one are dropped.
+    """
+    for rag_key, updates in _background_results.pop(session_id, None) or ():
+        if rag_key != state.get('rag_key'):
+            continue
+        for key, value in updates.items():
+            if key == 'style_outputs':
+                # Explanations already written for a style win over prefetched ones
+                value = {**value, **(state.get('style_outputs') or {})}
+            state[key] = value
+
+
+def _store_session_state(state, events):
+    """
+    Extract RAG results and student info from the session's events and store
+    them in session state. Called by combined_after_callback with the callback
+    context's state, so the writes are persisted as the callback's state delta.
     
-    IMPORTANT: This callback runs AFTER the agent completes, so it won't cause loops.
-    It only stores state - it doesn't trigger another agent execution.
+    Also keeps the turn's explanation in state["style_outputs"] (first one per style,
+    and per language for style 4), so a later switch back to that style is served
+    without the model.
     
-    This is needed because LLM agents respond with text, not structured JSON with stateDelta.
+    Events and parts are read with getattr, so there is nothing to guard here.
     """
-    try:
-        invocation_context = callback_context._invocation_context
-        session = invocation_context.session
+    output_key = style_output_key(state)
+    final_explanation = state.get('final_explanation')
+    if output_key and final_explanation:
+        style_outputs = state.get('style_outputs') or {}
+        if output_key not in style_outputs:
+            # Written as a new dict - a change inside the stored dict isn't a state delta
+            state['style_outputs'] = {**style_outputs, output_key: final_explanation}
+    if 'rag_results' in state and 'student_info' in state:
+        # State already stored, skip
+        return
+    
+    if events:
+        rag_results = None
+        student_info = None
+        
+        # Only look at events added since the last scan - earlier events
+        # were already processed on a previous turn
+        start_idx = state.get('_last_scanned_event_idx', 0)
+        new_events = events[start_idx:]
         
-        # Check if state already exists - don't overwrite unnecessarily
-        if hasattr(session, 'state') and session.state:
-            if 'rag_results' in session.state and 'student_info' in session.state:
-                # State already stored, skip
-                return
+        # Single newest-first pass over the new events collecting the signals still missing:
+        # - the LATEST search_corpus_by_name function response (rag_results)
+        # - the LATEST user message with the board/grade/subject/question pattern
+        need_rag = 'rag_results' not in state
+        need_info = 'student_info' not in state
+        for event in reversed(new_events):
+            content = getattr(event, 'content', None)
+            if not content:
+                continue
+            # Student info only comes from the student's own messages
+            from_user = getattr(event, 'author', 'user') == 'user'
+            if not (need_rag or (need_info and from_user)):
+                continue
+            for part in getattr(content, 'parts', None) or ():
+                if need_rag and rag_results is None:
+                    func_response = getattr(part, 'function_response', None)
+                    if func_response is not None and func_response.name == corpus_tools.SEARCH_TOOL_NAME:
+                        response = getattr(func_response, 'response', None)
+                        # Only a dict response can be stored and presented
+                        if isinstance(response, dict):
+                            rag_results = response
+                            logger.debug("📋 Extracted rag_results from tool call")
+                if need_info and student_info is None and from_user:
+                    text = getattr(part, 'text', None)
+                    if text:
+                        student_info = extract_student_info(text)
+                        if student_info is not None:
+                            logger.debug("📋 Extracted student_info: %s", student_info)
+            if (rag_results is not None or not need_rag) and (student_info is not None or not need_info):
+                break  # Found everything we need
         
-        # Get events from the session to find tool calls and responses
-        if hasattr(session, 'events') and session.events:
-            rag_results = None
-            student_info = None
-            
-            # Look through events for search_corpus_by_name function response
-            # Only process the LATEST function response to avoid duplicates
-            for event in reversed(session.events):  # Start from most recent
-                # Check for function response with RAG results
-                if hasattr(event, 'content') and event.content:
-                    for part in event.content.parts if hasattr(event.content, 'parts') else []:
-                        if hasattr(part, 'function_response'):
-                            func_response = part.function_response
-                            if func_response.name == 'search_corpus_by_name':
-                                # Extract RAG results from function response
-                                if hasattr(func_response, 'response'):
-                                    rag_results = func_response.response
-                                    print(f"📋 Extracted rag_results from tool call")
-                                    break  # Found latest, stop looking
-                if rag_results:
-                    break
-            
-            # Extract student info from user message or previous state
-            # Look for user message with board/grade/subject/question pattern
-            for event in session.events:
-                if hasattr(event, 'content') and event.content:
-                    for part in event.content.parts if hasattr(event.content, 'parts') else []:
-                        if hasattr(part, 'text'):
-                            text = part.text
-                            # Try to extract board/grade/subject/question from message
-                            # Pattern: "BOARD-grade-GRADE-SUBJECT. Question: QUESTION"
-                            import re
-                            match = re.search(r'([A-Za-z]+)-grade-(\d+)-([A-Za-z]+)\.\s*Question:\s*(.+)', text, re.IGNORECASE)
-                            if match:
-                                board = match.group(1)
-                                grade = match.group(2)
-                                subject = match.group(3)
-                                question = match.group(4).strip()
-                                student_info = {
-                                    "board": board,
-                                    "grade": grade,
-                                    "subject": subject,
-                                    "question": question
-                                }
-                                print(f"📋 Extracted student_info: {student_info}")
-                                break
-            
-            # Store state if we found RAG results and don't already have it
-            if rag_results and student_info:
-                # Update session state only if not already stored
-                if not hasattr(session, 'state') or not session.state:
-                    session.state = {}
-                
-                # Only store if not already present
-                if 'rag_results' not in session.state:
-                    session.state['rag_results'] = rag_results
-                    print(f"📋 Storing rag_results in session state")
-                if 'student_info' not in session.state:
-                    session.state['student_info'] = student_info
-                    print(f"📋 Storing student_info in session state: {student_info}")
-                if 'style_selected' not in session.state:
-                    session.state['style_selected'] = False
-                if 'current_style' not in session.state:
-                    session.state['current_style'] = None
-                
-                # Verify state was stored
-                if 'rag_results' in session.state and 'student_info' in session.state:
-                    print(f"✅ Successfully stored session state: rag_results and student_info")
-                    print(f"📋 State keys: {list(session.state.keys())}")
-                else:
-                    print(f"⚠️ Warning: State storage incomplete!")
-            elif rag_results:
-                # Only RAG results found, check if student_info exists in state
-                if hasattr(session, 'state') and session.state:
-                    if 'student_info' in session.state and 'rag_results' not in session.state:
-                        session.state['rag_results'] = rag_results
-                        print(f"✅ Stored rag_results (student_info already exists)")
-    except Exception as e:
-        print(f"⚠️ Error storing session state: {e}")
-
-
-# Callback to automatically save sessions to Memory Service (In-Memory or Vertex AI Memory Bank)
-async def auto_save_session_to_memory_callback(callback_context):
-    """
-    Automatically save completed sessions to Memory Service.
-    
-    This callback extracts meaningful information from sessions and stores it
-    in the long-term memory (InMemoryMemoryService or VertexAiMemoryBankService)
-    for future retrieval across sessions.
-    
-    Per ADK Documentation: https://google.github.io/adk-docs/sessions/memory/
-    
-    Usage:
-        The callback is automatically used when Memory Service is configured.
-        For In-Memory: No configuration needed (default)
-        For Vertex AI Memory Bank: Use --memory_service_uri="agentengine://ID"
+        state['_last_scanned_event_idx'] = len(events)
+        
+        # Store each signal as soon as it is found: the cursor has moved past its
+        # event, so it won't be rescanned on a later turn. Only missing keys were
+        # searched for, so nothing already in state is overwritten
+        if rag_results is not None:
+            state['rag_results'] = rag_results
+            if 'current_style' not in state:
+                state['current_style'] = None
+            logger.debug("📋 Stored rag_results in session state")
+        if student_info is not None:
+            state['student_info'] = student_info.to_dict()
+            logger.debug("📋 Stored student_info in session state: %s", student_info)
+
+
+async def _prefetch_explanations(rag_results, question, rag_key):
+    """Generate the style explanations; returns the state["style_outputs"] update."""
+    explanations = await prefetch_all_styles(rag_results, {"question": question})
+    if not explanations:
+        return None
+    logger.debug("📋 Prefetched explanations: %s", list(explanations))
+    if RAG_SEARCH_CACHE_TTL > 0:
+        _PREFETCHED_EXPLANATIONS[rag_key] = explanations
+    return {'style_outputs': explanations}
+
+
+# Before tool callback to build the corpus name in code rather than in the prompt
+async def before_tool_callback(tool, args, tool_context):
+    """
+    Fill in search_corpus_by_name's corpus_name from the student's message.
+    
+    When the board, grade and subject can be extracted from the message (see
+    rag.info_extractor) and the corpus_name passed doesn't name an existing corpus,
+    it is replaced with the first existing name built with build_corpus_name() from
+    the subject or its other spellings ("Mathematics", "maths", "math"), else with
+    the name built from the subject - so a mis-assembled name can't send the search
+    to the wrong corpus, and a corpus named "cbse-grade-1-math" is still found.
+    Returns None so the tool runs with the (amended) args.
+    """
+    if tool.name != corpus_tools.SEARCH_TOOL_NAME:
+        return None
+    student_info = _message_student_info(tool_context)
+    if student_info is None:
+        return None
+    names = [
+        corpus_tools.build_corpus_name(student_info.board, student_info.grade, subject)
+        for subject in subject_spellings(student_info.subject)
+    ]
+    # The name index is a blocking lookup (it may list the corpora), so it runs in a worker thread
+    resolved = await asyncio.to_thread(corpus_tools.resolve_corpus_name, [args.get('corpus_name'), *names])
+    args['corpus_name'] = resolved or names[0]
+    return None
+
+
+def _message_student_info(tool_context):
+    """The StudentInfo in the student's current message, or None (see rag.info_extractor)."""
+    invocation_context = _get_invocation_context(tool_context)
+    user_content = getattr(invocation_context, 'user_content', None)
+    for part in getattr(user_content, 'parts', None) or ():
+        text = getattr(part, 'text', None)
+        student_info = extract_student_info(text) if text else None
+        if student_info is not None:
+            return student_info
+    return None
+
+
+async def _store_memory_note(rag_results, question):
+    """Condense the RAG results; returns the state["rag_note"] update."""
+    note = await build_memory_note(rag_results, question)
+    if not note:
+        return None
+    logger.debug("📋 Built memory note with %d key points", len(note.get('key_points') or ()))
+    return {'rag_note': note}
+
+
+# After tool callback to process the RAG results while they are presented
+async def after_tool_callback(tool, args, tool_context, tool_response):
+    """
+    Store the results of a successful search_corpus_by_name call as the session's
+    topic and start background work on them:
+    - condense them into the memory note sent to the model on later turns
+    - prefetch the style explanations (if EXPLANATION_PREFETCH_ENABLED)
+    
+    The tasks run alongside the rest of the turn; their results are written to
+    state by the next callback that runs once they are done, so by the time the
+    student picks a style the note and explanations are usually already there.
+    Returns None so the tool response is passed through unchanged.
+    """
+    if tool.name != corpus_tools.SEARCH_TOOL_NAME:
+        return None
+    if not isinstance(tool_response, dict) or tool_response.get('status') != 'success':
+        return None
+    
+    # A new search replaces the topic: its results, note, explanations and chosen
+    # style are reset together, so the <state> block and fetch_passage never pair
+    # the new results with the previous topic's. Repeating the current search
+    # (same results) keeps its note and explanations.
+    state = tool_context.state
+    question = args.get('query_text')
+    rag_key = _rag_fingerprint(tool_response)
+    new_topic = state.get('rag_key') != rag_key
+    state['rag_key'] = rag_key
+    state['rag_results'] = tool_response
+    if new_topic:
+        state['rag_note'] = None
+        # Explanations prefetched for the same results (a search cache hit) are reused
+        state['style_outputs'] = dict(_PREFETCHED_EXPLANATIONS.get(rag_key) or {})
+    state['current_style'] = None
+    state['_style_toggle'] = False
+    student_info = _message_student_info(tool_context)
+    if student_info is not None:
+        state['student_info'] = student_info.to_dict()
+    elif state.get('student_info') and question:
+        state['student_info'] = {**state['student_info'], 'question': question}
+    
+    session_id = _session_id(tool_context)
+    if new_topic:
+        # A newer search supersedes the work still running for the previous one
+        for task in _background_tasks.pop(session_id, ()):
+            task.cancel()
+        _background_results.pop(session_id, None)
+    elif _background_tasks.get(session_id):
+        return None  # The work for these results is already running
+    
+    if not state.get('rag_note'):
+        _start_background_task(session_id, rag_key, _store_memory_note(tool_response, question))
+    if EXPLANATION_PREFETCH_ENABLED and not state.get('style_outputs'):
+        _start_background_task(session_id, rag_key, _prefetch_explanations(tool_response, question, rag_key))
+    return None
+
+
+# Sessions waiting to be saved to the memory service: session id -> (session, memory_service).
+# Saves run in the background so the turn doesn't wait for the Memory Bank RPC; a session
+# queued again before its save started is saved once, in its latest state.
+_pending_memory_saves = {}
+# Sessions whose save has started but not finished (same layout), so a save cut off
+# by shutdown is retried by _flush_memory_saves_at_exit
+_running_memory_saves = {}
+_memory_save_task = None
+# Maximum number of add_session_to_memory calls in flight at once
+_MEMORY_SAVE_CONCURRENCY = 4
+
+
+def _queue_memory_save(session, memory_service):
+    """Queue a session for saving to the memory service and make sure the saver task is running."""
+    global _memory_save_task
+    if not (memory_service and hasattr(memory_service, 'add_session_to_memory')):
+        return
+    _pending_memory_saves[session.id] = (session, memory_service)
+    if (_memory_save_task is None or _memory_save_task.done()
+            or _memory_save_task.get_loop() is not asyncio.get_running_loop()):
+        _memory_save_task = asyncio.create_task(_drain_memory_saves())
+
+
+async def _drain_memory_saves():
+    """
+    Save the queued sessions, at most _MEMORY_SAVE_CONCURRENCY at a time, until the queue is empty.
+    
+    Nothing awaits this task, so a failed save (e.g. a Memory Bank API error) is
+    logged here and doesn't stop the sessions saved alongside it or queued after it.
+    """
+    semaphore = asyncio.Semaphore(_MEMORY_SAVE_CONCURRENCY)
+    
+    async def save(session, memory_service):
+        try:
+            async with semaphore:
+                await _save_session_to_memory(session, memory_service)
+        finally:
+            _running_memory_saves.pop(session.id, None)
+    
+    while _pending_memory_saves:
+        batch = list(_pending_memory_saves.values())
+        _running_memory_saves.update(_pending_memory_saves)
+        _pending_memory_saves.clear()
+        results = await asyncio.gather(
+            *(save(session, memory_service) for session, memory_service in batch),
+            return_exceptions=True
+        )
+        for (session, _), result in zip(batch, results):
+            if isinstance(result, Exception):
+                logger.warning("Error saving session %s to Memory Service: %s", session.id, result,
+                               exc_info=result)
+
+
+async def flush_memory_saves():
+    """
+    Wait until every queued session is saved to the memory service.
+    
+    For hosts with an async shutdown hook; without one, the saves still pending
+    at interpreter exit are made by _flush_memory_saves_at_exit.
     """
+    while (_memory_save_task is not None and not _memory_save_task.done()
+           and _memory_save_task.get_loop() is asyncio.get_running_loop()):
+        await asyncio.shield(_memory_save_task)
+    if _pending_memory_saves:
+        await _drain_memory_saves()
+
+
+@atexit.register
+def _flush_memory_saves_at_exit():
+    """Save the sessions still queued (or cut off mid-save) when the process exits."""
+    _pending_memory_saves.update({
+        session_id: entry for session_id, entry in _running_memory_saves.items()
+        if session_id not in _pending_memory_saves
+    })
+    _running_memory_saves.clear()
+    if not _pending_memory_saves:
+        return
+    logger.info("Saving %d session(s) to Memory Service before exit", len(_pending_memory_saves))
     try:
-        invocation_context = callback_context._invocation_context
-        session = invocation_context.session
-        memory_service = invocation_context.memory_service
-        
-        if memory_service and hasattr(memory_service, 'add_session_to_memory'):
-            await memory_service.add_session_to_memory(session)
-            print(f"✅ Session {session.id} saved to Memory Service")
-    except Exception as e:
-        print(f"⚠️ Error saving session to Memory Service: {e}")
+        asyncio.run(_drain_memory_saves())
+    except RuntimeError as e:
+        logger.warning("Could not save sessions to Memory Service at exit: %s", e)
+
 
+async def _save_session_to_memory(session, memory_service):
+    """Add the session to the memory service, if one is configured."""
+    if not (memory_service and hasattr(memory_service, 'add_session_to_memory')):
+        return
+    await memory_service.add_session_to_memory(session)
+    logger.debug("✅ Session %s saved to Memory Service", session.id)
 
-# Before agent callback to ensure state is checked
-# This adds a reminder in the context to call load_memory_tool first
+
+# Before agent callback to ensure state is up to date before the turn starts
 async def before_agent_callback(callback_context):
     """
-    Before agent callback to remind agent to check state first.
-    This doesn't force the tool call, but adds context to help the agent remember.
+    Before agent callback to get session state ready for the turn.
+    Writes the results of background tasks that finished since the last callback
+    and classifies the student's style selection, so before_model_callback sends
+    up-to-date state. Background tasks still running are not waited for.
     """
+    invocation_context = _get_invocation_context(callback_context)
+    if invocation_context is None:
+        logger.warning("before_agent_callback: no invocation context on callback context")
+        return
     try:
-        invocation_context = callback_context._invocation_context
-        session = invocation_context.session
+        # Written through callback_context.state, so the session service persists the
+        # changes (before_model_callback trims the history and relies on this state)
+        state = callback_context.state
+        _apply_background_results(getattr(invocation_context.session, 'id', None), state)
         
-        # Get current state to check if it exists
-        if hasattr(session, 'state') and session.state:
-            state_keys = list(session.state.keys())
-            if 'student_info' in state_keys:
-                print(f"📋 State exists: {state_keys} - Agent should use this information!")
+        # Get current state to check if it exists (skipped unless debug logging is on)
+        if logger.isEnabledFor(logging.DEBUG):
+            if 'student_info' in state:
+                logger.debug("📋 State exists: %s - Agent should use this information!", list(state.to_dict()))
             else:
-                print(f"📋 State empty or no student_info - First message in session")
+                logger.debug("📋 No student_info in state - First message in session")
+        
+        # Once RAG results exist, a short reply to the style menu is a style selection -
+        # classify it here and store it so the model reads current_style instead of
+        # re-parsing. After a style is chosen, only a reply that is nothing but a style
+        # name ("2", "story") switches it; other follow-ups ("another example") are left
+        # to the model.
+        if state.get('rag_results'):
+            style_toggle = False
+            user_content = getattr(invocation_context, 'user_content', None)
+            parts = getattr(user_content, 'parts', None) or ()
+            text = ' '.join(part.text for part in parts if getattr(part, 'text', None))
+            if text:
+                style_name = is_style_name(text)
+                answering_menu = not state.get('current_style') and len(text.split()) < _STYLE_MAX_WORDS
+                style = classify_style(text) if style_name or answering_menu else None
+                if style is not None:
+                    state['current_style'] = STYLE_NAMES[style]
+                    # Nothing but a style name: a cached explanation in that style
+                    # answers it (see before_model_callback)
+                    style_toggle = style_name
+                # The language of a style-4 explanation, also when a later message
+                # ("now in tamil") switches it - explanations are cached per language
+                language = named_language(text)
+                if state.get('current_style') == STYLE_NAMES[4] and (style == 4 or language):
+                    state['style_language'] = language
+            # Only written when it changes, so most turns add no state delta
+            if state.get('_style_toggle') != style_toggle:
+                state['_style_toggle'] = style_toggle
+    except (AttributeError, KeyError, TypeError, ValueError) as e:
+        logger.warning("Error in before_agent_callback: %s", e, exc_info=True)
+
+
+def _passage_excerpt(text):
+    """Cut a passage to STATE_PASSAGE_MAX_CHARS (the full text stays available via fetch_passage)."""
+    if not STATE_PASSAGE_MAX_CHARS or len(text) <= STATE_PASSAGE_MAX_CHARS:
+        return text
+    return text[:STATE_PASSAGE_MAX_CHARS].rstrip() + "..."
+
+
+def _state_block(state):
+    """
+    Serialize the session state the model needs into a compact <state>{...}</state> block.
+    
+    Only the keys in _STATE_BLOCK_KEYS, the RAG results, and the template and
+    cached explanation for the current style are included - bookkeeping keys
+    (event cursor, rag_key, other styles' outputs) never reach the model.
+    The RAG results are sent as parallel lists (texts, scores, sources) with the
+    list index as passage id, rather than one object per passage, so the field
+    names aren't repeated per passage and an explanation can take all passages
+    as one list. Once the memory note exists, it replaces the passage texts;
+    until then each passage is cut to STATE_PASSAGE_MAX_CHARS.
+    """
+    payload = {key: state.get(key) for key in _STATE_BLOCK_KEYS if key in state}
+    rag_results = state.get('rag_results')
+    if rag_results:
+        results = rag_results.get("results") or ()
+        summary = {"status": rag_results.get("status"), "count": len(results)}
+        rag_note = state.get('rag_note')
+        if rag_note:
+            summary["note"] = rag_note
         else:
-            print(f"📋 No state yet - First message in session")
-    except Exception as e:
-        print(f"⚠️ Error in before_agent_callback: {e}")
+            summary["texts"] = [_passage_excerpt(result.get("text") or "") for result in results]
+        summary["scores"] = [result.get("relevance_score") for result in results]
+        summary["sources"] = [result.get("source_uri") for result in results]
+        payload['rag_results'] = summary
+    current_style = state.get('current_style')
+    if current_style in _STYLE_NUMBERS:
+        payload['style_instructions'] = STYLES[_STYLE_NUMBERS[current_style]]
+    cached = (state.get('style_outputs') or {}).get(style_output_key(state))
+    if cached:
+        payload['cached_explanation'] = cached
+    return "<state>" + _dumps(payload) + "</state>"
+
 
+def _dumps(obj):
+    """Compact JSON with non-ASCII text kept as-is (orjson when installed, else json)."""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj, default=str, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=str)
 
-# Configure main_agent with callbacks
-# before_agent_callback: Reminds agent to check state (doesn't force it, but helps)
-# after_agent_callback: Stores session state AND saves sessions to memory
-# Note: We need to store session state because LLM agents can't set stateDelta directly
-main_agent.before_agent_callback = before_agent_callback
 
-# Combined callback: Store session state first, then save to memory
+def _trim_history(contents, max_turns):
+    """
+    Drop everything before the max_turns-th most recent student message.
+    
+    Student messages are user contents with text; function responses (also sent
+    as user contents) don't start a turn, so tool calls of the kept turns stay intact.
+    """
+    if max_turns <= 0:
+        return contents
+    turns = 0
+    for idx in range(len(contents) - 1, -1, -1):
+        content = contents[idx]
+        if content.role == 'user' and any(getattr(part, 'text', None) for part in content.parts or ()):
+            turns += 1
+            if turns == max_turns:
+                return contents[idx:]
+    return contents
+
+
+# Before model callback to hand session state to the model without a tool call
+async def before_model_callback(callback_context, llm_request):
+    """
+    Attach the session state to the latest user turn as a <state> block.
+    
+    The model reads state from this block instead of calling load_memory_tool,
+    which saves a full model -> tool -> model round trip on every message.
+    Since the block carries the conversation's context, only the last
+    MODEL_HISTORY_TURNS student turns of the history are sent, so the request
+    doesn't grow with every message of the session.
+    
+    Steps that follow from the state and the last message alone (the turn-1
+    search call and RAG presentation, a cached explanation for a style
+    selection) are answered by rag.router.route() without calling the model.
+    
+    Until there are RAG results and a chosen style, the model only routes (calls
+    the search tool or asks for a style), so those calls go to the smaller
+    ROUTER_MODEL; explanations are generated with AGENT_MODEL.
+    Returns None so the (amended) request is sent to the model as usual.
+    """
+    try:
+        contents = llm_request.contents = _trim_history(llm_request.contents, MODEL_HISTORY_TURNS)
+        if not contents:
+            return None
+        state = callback_context.state
+        # Background results that finished during the turn (e.g. a prefetched explanation)
+        _apply_background_results(_session_id(callback_context), state)
+        routed = route(state, contents)
+        if routed is not None:
+            return LlmResponse(content=routed)
+        if ROUTER_MODEL and _instruction_phase(state) != "explain":
+            llm_request.model = ROUTER_MODEL
+        block = types.Part(text=_state_block(state))
+        if contents[-1].role == 'user':
+            contents[-1].parts = [*(contents[-1].parts or ()), block]
+        else:
+            contents.append(types.Content(role='user', parts=[block]))
+    except (AttributeError, KeyError, TypeError, ValueError) as e:
+        logger.warning("Error in before_model_callback: %s", e, exc_info=True)
+    return None
+
+
+# After agent callback: store session state, then save the session to memory
 async def combined_after_callback(callback_context):
-    """Store session state, then save to memory service."""
-    await store_session_state_callback(callback_context)
-    await auto_save_session_to_memory_callback(callback_context)
+    """
+    Store session state, then save the session to the memory service.
+    
+    LLM agents respond with text, not a stateDelta, so the RAG results and student
+    info are extracted from the session's events (see _store_session_state) and
+    stored right away through callback_context.state, which persists them with the
+    callback's state delta. The session is then queued for saving to the memory
+    service (In-Memory or Vertex AI Memory Bank, see
+    https://google.github.io/adk-docs/sessions/memory/); the save runs in the
+    background, so the response isn't held up by it.
+    """
+    invocation_context = _get_invocation_context(callback_context)
+    if invocation_context is None:
+        logger.warning("combined_after_callback: no invocation context on callback context")
+        return
+    try:
+        session = invocation_context.session
+        memory_service = invocation_context.memory_service
+    except AttributeError as e:
+        logger.warning("Error in combined_after_callback: %s", e, exc_info=True)
+        return
+    
+    _store_session_state(callback_context.state, getattr(session, 'events', None))
+    _queue_memory_save(session, memory_service)
+
+
+async def _explain_batch_item(student_info, rag_results, explanation_style):
+    """Generate one run_batch explanation from its RAG results."""
+    result = generate_explanation(rag_results, explanation_style=explanation_style, question=student_info.question)
+    if result.get("status") != "success":
+        return result
+    return {"status": "success", "explanation": await generate(result["explanation_prompt"])}
+
+
+async def run_batch(prompts: List[str], explanation_style: str = "with example") -> List[Dict[str, Any]]:
+    """
+    Answer many student questions at once, e.g. a tutor going through a homework set.
+    
+    Bypasses the conversational agent: each prompt must name the board, grade,
+    subject and question (see rag.info_extractor). The corpus name index is
+    loaded once, then all RAG searches and all explanation generations run
+    concurrently.
+    
+    Args:
+        prompts: The student messages
+        explanation_style: Style for every explanation (see generate_explanation)
+    
+    Returns:
+        One dictionary per prompt, in order, with status, student_info, rag_results
+        and explanation (or error_message)
+    """
+    student_infos = []
+    groups = defaultdict(list)  # corpus name -> indexes into prompts
+    for idx, prompt in enumerate(prompts):
+        student_info = extract_student_info(prompt)
+        student_infos.append(student_info)
+        if student_info is None:
+            continue
+        groups[corpus_tools.build_corpus_name(student_info.board, student_info.grade, student_info.subject)].append(idx)
+    
+    # One lookup before fanning out loads (or builds) the corpus name index once; the
+    # concurrent searches below then resolve their corpora from it instead of each
+    # listing the corpora on a cold start
+    if groups:
+        await asyncio.to_thread(corpus_tools.get_corpus_by_name, next(iter(groups)))
+    
+    searches = [(idx, name) for name, idxs in groups.items() for idx in idxs]
+    rag_responses = await asyncio.gather(*(
+        corpus_tools.search_corpus_by_name(name, student_infos[idx].question) for idx, name in searches
+    ))
+    
+    results = [
+        {"status": "error", "prompt": prompt,
+         "error_message": "Could not find the board, grade, subject and question in the prompt"}
+        for prompt in prompts
+    ]
+    pending = []
+    for (idx, _), rag_results in zip(searches, rag_responses):
+        results[idx] = {
+            "status": rag_results.get("status"),
+            "prompt": prompts[idx],
+            "student_info": student_infos[idx].to_dict(),
+            "rag_results": rag_results
+        }
+        if rag_results.get("status") == "success":
+            pending.append(idx)
+        else:
+            results[idx]["error_message"] = rag_results.get("error_message")
+    
+    explanations = await asyncio.gather(*(
+        _explain_batch_item(student_infos[idx], results[idx]["rag_results"], explanation_style)
+        for idx in pending
+    ), return_exceptions=True)
+    for idx, explanation in zip(pending, explanations):
+        if isinstance(explanation, Exception):
+            logger.warning("Batch explanation failed for prompt %d: %s", idx, explanation)
+            results[idx].update(status="error", error_message=str(explanation))
+        elif explanation.get("status") != "success":
+            results[idx].update(status="error", error_message=explanation.get("message"))
+        else:
+            results[idx]["explanation"] = explanation["explanation"]
+    return results
+
+
+@lru_cache(maxsize=1)
+def get_main_agent():
+    """
+    Create the main orchestrator agent on first use.
+    
+    Building the Agent is deferred until it is actually needed, so importing this
+    module (or rag.config through the rag package) doesn't pay for ADK agent setup.
+    The result is cached - every caller gets the same agent.
+    """
+    agent = Agent(
+        name="explanation_main_agent",
+        model=AGENT_MODEL,
+        description="Main orchestrator agent for student question explanations using RAG",
+        instruction=_instruction,
+        tools=list(_DEFAULT_TOOLS),
+        output_key="final_explanation"
+    )
+    
+    # Configure the agent with callbacks
+    # before_agent_callback: Writes finished background results and classifies the style selection
+    # before_model_callback: Sends session state with every model call as a <state> block
+    # after_agent_callback: Stores session state AND saves sessions to memory
+    # Note: We need to store session state because LLM agents can't set stateDelta directly
+    agent.before_agent_callback = before_agent_callback
+    agent.before_model_callback = before_model_callback
+    agent.after_agent_callback = combined_after_callback
+    # before_tool_callback: Builds the corpus name from the student's message
+    agent.before_tool_callback = before_tool_callback
+    # after_tool_callback: Builds the memory note and prefetches explanations once the RAG search returns
+    agent.after_tool_callback = after_tool_callback
+    return agent
 
-main_agent.after_agent_callback = combined_after_callback
 
+def __getattr__(name):
+    """Keep `from rag.main_agent import main_agent` working with the lazy factory (PEP 562)."""
+    if name == "main_agent":
+        return get_main_agent()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -19,7 +19,9 @@ Prerequisites:
 4. Authentication: gcloud auth application-default login
 """
 
+import logging
 import os
+from functools import lru_cache
 from typing import Optional
 
 try:
@@ -32,6 +34,8 @@ except ImportError:
     PreloadMemoryTool = None
     MEMORY_BANK_AVAILABLE = False
 
+logger = logging.getLogger(__name__)
+
 
 def get_memory_service(agent_engine_id: Optional[str] = None) -> Optional[VertexAiMemoryBankService]:
     """
@@ -56,13 +60,14 @@ def get_memory_service(agent_engine_id: Optional[str] = None) -> Optional[Vertex
     agent_engine_id = agent_engine_id or os.environ.get("AGENT_ENGINE_ID")
     
     if not all([project_id, location, agent_engine_id]):
-        print("Warning: Vertex AI Memory Bank not configured. Missing:")
-        if not project_id:
-            print("  - GOOGLE_CLOUD_PROJECT environment variable")
-        if not location:
-            print("  - GOOGLE_CLOUD_LOCATION environment variable")
-        if not agent_engine_id:
-            print("  - AGENT_ENGINE_ID environment variable or parameter")
+        missing = [
+            name for name, value in (
+                ("GOOGLE_CLOUD_PROJECT environment variable", project_id),
+                ("GOOGLE_CLOUD_LOCATION environment variable", location),
+                ("AGENT_ENGINE_ID environment variable or parameter", agent_engine_id),
+            ) if not value
+        ]
+        logger.warning("Vertex AI Memory Bank not configured. Missing: %s", ", ".join(missing))
         return None
     
     try:
@@ -72,7 +77,7 @@ def get_memory_service(agent_engine_id: Optional[str] = None) -> Optional[Vertex
             agent_engine_id=agent_engine_id
         )
     except Exception as e:
-        print(f"Error creating Vertex AI Memory Bank Service: {e}")
+        logger.error("Error creating Vertex AI Memory Bank Service: %s", e)
         return None
 
 
@@ -96,17 +101,19 @@ async def auto_save_session_to_memory_callback(callback_context):
         
         if memory_service and hasattr(memory_service, 'add_session_to_memory'):
             await memory_service.add_session_to_memory(session)
-            print(f"Session {session.id} saved to Memory Bank")
+            logger.debug("Session %s saved to Memory Bank", session.id)
     except Exception as e:
-        print(f"Error saving session to Memory Bank: {e}")
+        logger.warning("Error saving session to Memory Bank: %s", e, exc_info=True)
 
 
+@lru_cache(maxsize=1)
 def get_preload_memory_tool():
     """
-    Get PreloadMemoryTool instance for agents.
+    Get the shared PreloadMemoryTool instance for agents.
     
     PreloadMemoryTool automatically retrieves relevant memories at the beginning
     of each agent turn, providing context from past conversations.
+    It keeps no per-request state, so every agent can share one instance.
     
     Returns:
         PreloadMemoryTool instance or None if not available
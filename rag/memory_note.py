@@ -0,0 +1,71 @@
+"""
+Memory Note - Compact summary of the RAG results kept in session state.
+
+Once the RAG search returns, a small model condenses the retrieved passages into
+a short JSON note (key points with the ids of the passages they come from). The
+main agent is sent this note instead of the raw passages on every later turn,
+and expands a passage with the fetch_passage tool when it needs the exact text.
+"""
+import importlib.util
+import json
+import logging
+from typing import Any, Dict, Optional
+
+from google.genai import types
+
+from rag.config import AGENT_MODEL, ROUTER_MODEL
+from rag.speculative import get_client
+
+ORJSON_AVAILABLE = importlib.util.find_spec("orjson") is not None
+if ORJSON_AVAILABLE:
+    import orjson
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on the note's length
+NOTE_MAX_TOKENS = 400
+
+_NOTE_PROMPT = """Summarize these textbook passages for a tutor who will explain them to a student.
+Return JSON: {{"key_points": [{{"point": "<one fact or idea>", "passages": [<passage ids>]}}]}}
+Keep every fact needed to answer the question; leave out anything else.
+
+Question: {question}
+
+Passages:
+{passages}"""
+
+
+async def build_memory_note(
+    rag_results: Dict[str, Any],
+    question: Optional[str] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Condenses the RAG results into a JSON memory note.
+
+    Args:
+        rag_results: The search_corpus_by_name response (with a "results" list)
+        question: The student's question, so the note keeps what answers it
+
+    Returns:
+        The note ({"key_points": [...]}), or None if there are no passages or the
+        model's output isn't valid JSON (e.g. cut off at NOTE_MAX_TOKENS)
+    """
+    results = rag_results.get("results") or []
+    if not results:
+        return None
+    passages = "\n\n".join(
+        f"[{passage_id}] {result.get('text', '')}" for passage_id, result in enumerate(results)
+    )
+    response = await get_client().aio.models.generate_content(
+        model=ROUTER_MODEL or AGENT_MODEL,
+        contents=_NOTE_PROMPT.format(question=question or "General explanation", passages=passages),
+        config=types.GenerateContentConfig(
+            response_mime_type="application/json",
+            max_output_tokens=NOTE_MAX_TOKENS,
+        ),
+    )
+    try:
+        return orjson.loads(response.text) if ORJSON_AVAILABLE else json.loads(response.text)
+    except (TypeError, ValueError):
+        logger.warning("Discarding memory note that isn't valid JSON")
+        return None
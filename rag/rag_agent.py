@@ -2,17 +2,15 @@
 RAG Agent - Searches corpus and retrieves relevant information for questions.
 This agent is called once per session to get the initial RAG results.
 """
+from functools import lru_cache
+
 from google.adk.agents import Agent
 from rag.tools import corpus_tools
 from rag.config import AGENT_MODEL
 
 
-# Create the RAG agent
-rag_agent = Agent(
-    name="rag_agent",
-    model=AGENT_MODEL,
-    description="Agent that searches RAG corpora to find relevant information for student questions",
-    instruction="""
+# Agent instruction
+_RAG_INSTRUCTION = """
     You are a RAG (Retrieval-Augmented Generation) agent specialized in searching educational content.
     
     Your role is to:
@@ -26,11 +24,32 @@ rag_agent = Agent(
     - Focus on retrieving accurate, relevant content from the corpus
     
     Return the search results in a structured format that can be used by the explanation agent.
-    """,
-    tools=[
-        corpus_tools.search_corpus_by_name_tool,
-        corpus_tools.query_rag_corpus_tool,
-    ],
-    output_key="rag_results"
-)
+    """
+
+
+@lru_cache(maxsize=1)
+def get_rag_agent():
+    """
+    Create the RAG agent on first use.
+    
+    Deferred like main_agent.get_main_agent(), so importing this module doesn't
+    construct the agent. The result is cached - every caller gets the same agent.
+    """
+    return Agent(
+        name="rag_agent",
+        model=AGENT_MODEL,
+        description="Agent that searches RAG corpora to find relevant information for student questions",
+        instruction=_RAG_INSTRUCTION,
+        tools=[
+            corpus_tools.search_corpus_by_name_tool,
+            corpus_tools.query_rag_corpus_tool,
+        ],
+        output_key="rag_results"
+    )
+
 
+def __getattr__(name):
+    """Keep `from rag.rag_agent import rag_agent` working with the lazy factory (PEP 562)."""
+    if name == "rag_agent":
+        return get_rag_agent()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,143 @@
+"""
+Router - Deterministic routing of the main agent's model steps.
+
+Most steps of the explanation flow follow from the session state and the last
+message alone, so they are answered in Python instead of by the model:
+1. The student's message names board, grade, subject and question (see
+   rag.info_extractor): the search_corpus_by_name call is issued directly.
+2. The search just succeeded: the merged RAG text is presented verbatim with
+   the style menu.
+3. The student only named a style that already has an explanation in
+   state["style_outputs"]: that explanation is returned as-is. Style-4
+   explanations are kept per language (see style_output_key), so naming
+   another language is never answered with the previous one.
+The model is only called for what's left - mainly writing the explanation.
+
+route() is used by main_agent.before_model_callback to skip the model call, and
+by RoutedPreloadMemoryTool to skip the memory search for a request the model
+will never see.
+"""
+import importlib.util
+from typing import Any, Mapping, Optional, Sequence
+
+from google.genai import types
+
+from rag.info_extractor import extract_student_info
+from rag.style_classifier import STYLE_NAMES
+from rag.style_templates import STYLE_MENU_TEXT
+from rag.tools import corpus_tools
+
+# Probe for the memory tool once instead of relying on a failed import.
+# Parents are checked first: find_spec() raises if a parent package is missing.
+PRELOAD_MEMORY_AVAILABLE = all(
+    importlib.util.find_spec(name) is not None
+    for name in ('google', 'google.adk', 'google.adk.tools', 'google.adk.tools.preload_memory_tool')
+)
+
+if PRELOAD_MEMORY_AVAILABLE:
+    from google.adk.tools.preload_memory_tool import PreloadMemoryTool
+else:
+    PreloadMemoryTool = None
+
+
+def style_output_key(state: Mapping[str, Any]) -> Optional[str]:
+    """
+    The state["style_outputs"] key of the session's current style: the style name,
+    plus the language chosen for style 4 (e.g. "native_language:tamil").
+    """
+    current_style = state.get('current_style')
+    language = state.get('style_language')
+    if current_style == STYLE_NAMES[4] and language:
+        return f"{current_style}:{language}"
+    return current_style
+
+
+def _search_response(content):
+    """Return the successful search_corpus_by_name response in content, or None."""
+    for part in getattr(content, 'parts', None) or ():
+        func_response = getattr(part, 'function_response', None)
+        if func_response is not None and func_response.name == corpus_tools.SEARCH_TOOL_NAME:
+            response = getattr(func_response, 'response', None)
+            if isinstance(response, dict) and response.get('status') == 'success':
+                return response
+    return None
+
+
+def _rag_presentation(rag_results):
+    """
+    The first-turn answer: every RAG result text merged into one continuous text
+    (duplicates dropped, nothing summarized), followed by STYLE_MENU_TEXT.
+    """
+    texts = dict.fromkeys(
+        text.strip() for result in rag_results.get('results') or () if (text := result.get('text'))
+    )
+    return "Here's what I found from your textbook:\n\n" + "\n\n".join(texts) + "\n\n" + STYLE_MENU_TEXT
+
+
+def _search_call(content):
+    """
+    Return a search_corpus_by_name function call for a student message that
+    names board, grade, subject and question, or None.
+    """
+    if getattr(content, 'role', None) != 'user':
+        return None
+    text = ' '.join(part.text for part in content.parts or () if getattr(part, 'text', None))
+    student_info = extract_student_info(text) if text else None
+    if student_info is None:
+        return None
+    return types.FunctionCall(
+        name=corpus_tools.SEARCH_TOOL_NAME,
+        args={
+            "corpus_name": corpus_tools.build_corpus_name(
+                student_info.board, student_info.grade, student_info.subject
+            ),
+            "query_text": student_info.question,
+        }
+    )
+
+
+def route(state: Mapping[str, Any], contents: Sequence[types.Content]) -> Optional[types.Content]:
+    """
+    Returns the model turn for a request that can be answered without the model.
+
+    Args:
+        state: The session state
+        contents: The request's conversation contents
+
+    Returns:
+        The model Content (the search call, the RAG presentation or a cached
+        explanation), or None if the request needs the model
+    """
+    if not contents:
+        return None
+    rag_results = _search_response(contents[-1])
+    if rag_results is not None:
+        return types.Content(role='model', parts=[types.Part(text=_rag_presentation(rag_results))])
+    if not state.get('rag_results'):
+        search_call = _search_call(contents[-1])
+        if search_call is not None:
+            return types.Content(role='model', parts=[types.Part(function_call=search_call)])
+    if state.get('_style_toggle'):
+        cached = (state.get('style_outputs') or {}).get(style_output_key(state))
+        if cached:
+            return types.Content(role='model', parts=[types.Part(text=cached)])
+    return None
+
+
+if PreloadMemoryTool is not None:
+    class RoutedPreloadMemoryTool(PreloadMemoryTool):
+        """
+        PreloadMemoryTool that skips the memory search for routed requests.
+
+        ADK preloads memory while building every model request, before
+        before_model_callback runs - so on turn 1 the search call and the RAG
+        presentation would each wait for a memory search whose result is thrown
+        away with the skipped model call.
+        """
+
+        async def process_llm_request(self, *, tool_context, llm_request):
+            if route(tool_context.state, llm_request.contents) is not None:
+                return
+            await super().process_llm_request(tool_context=tool_context, llm_request=llm_request)
+else:
+    RoutedPreloadMemoryTool = None
@@ -0,0 +1,81 @@
+"""
+Speculative Explanations - Generates explanation styles before the student picks one.
+
+As soon as the RAG search returns, the style-specific explanations are generated
+concurrently while the main agent is still presenting the RAG results. When the
+student then picks a style, the main agent returns the prefetched explanation
+instead of waiting for a fresh model call.
+
+Style 4 (native or user suggested language) is not prefetched: the language is
+only known once the student names it.
+"""
+import asyncio
+import logging
+from functools import lru_cache
+from typing import Any, Dict, Optional
+
+from rag.config import AGENT_MODEL
+from rag.style_classifier import STYLE_NAMES
+from rag.tools.explanation_tools import generate_explanation
+
+logger = logging.getLogger(__name__)
+
+# Style number -> explanation_style argument for generate_explanation()
+PREFETCH_STYLES = {
+    1: "with example",
+    2: "with memory technique",
+    3: "using story",
+}
+
+
+@lru_cache(maxsize=1)
+def get_client():
+    """
+    Shared google-genai client, created on first use.
+    Picks up the same credentials as the ADK agents (GOOGLE_API_KEY or
+    GOOGLE_GENAI_USE_VERTEXAI with GOOGLE_CLOUD_PROJECT/GOOGLE_CLOUD_LOCATION).
+    """
+    from google import genai
+    return genai.Client()
+
+
+async def generate(prompt: str) -> str:
+    """Runs one explanation prompt against AGENT_MODEL."""
+    response = await get_client().aio.models.generate_content(model=AGENT_MODEL, contents=prompt)
+    return response.text
+
+
+async def prefetch_all_styles(
+    rag_results: Dict[str, Any],
+    student_info: Optional[Dict[str, Any]] = None
+) -> Dict[str, str]:
+    """
+    Generates the explanation for every prefetchable style concurrently.
+
+    Args:
+        rag_results: The search_corpus_by_name response (with a "results" list)
+        student_info: Optional student info; its "question" is used for context
+
+    Returns:
+        A dictionary mapping the style name stored in state["current_style"]
+        (e.g. "with_example") to the generated explanation. Styles whose
+        generation failed are left out.
+    """
+    question = (student_info or {}).get("question")
+    prompts = {}
+    for style, explanation_style in PREFETCH_STYLES.items():
+        result = generate_explanation(rag_results, explanation_style=explanation_style, question=question)
+        if result.get("status") == "success":
+            prompts[STYLE_NAMES[style]] = result["explanation_prompt"]
+    if not prompts:
+        return {}
+
+    texts = await asyncio.gather(*(generate(prompt) for prompt in prompts.values()), return_exceptions=True)
+
+    explanations = {}
+    for style_name, text in zip(prompts, texts):
+        if isinstance(text, Exception):
+            logger.warning("Prefetching the %s explanation failed: %s", style_name, text)
+        elif text:
+            explanations[style_name] = text
+    return explanations
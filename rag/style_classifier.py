@@ -0,0 +1,129 @@
+"""
+Style Classifier - Deterministic detection of the explanation style a student asks for.
+
+Maps short replies such as "1", "with example", "memory technique", "story" or a
+language name onto the four explanation styles:
+1. Explain with Example
+2. Explain with Memory Technique
+3. Explain using Story
+4. Explain using Native Language or User Suggested Language
+
+All keywords are matched in a single pass over the message with an Aho-Corasick
+automaton (pyahocorasick) when it is installed, falling back to one compiled
+regex alternation otherwise.
+"""
+import importlib.util
+import re
+from typing import Optional
+
+AHOCORASICK_AVAILABLE = importlib.util.find_spec("ahocorasick") is not None
+if AHOCORASICK_AVAILABLE:
+    import ahocorasick
+
+
+# Menu number -> style number. Only a reply that is nothing but the number selects
+# a style: "give me 4 examples" asks for examples, not style 4.
+STYLE_DIGITS = {"1": 1, "2": 2, "3": 3, "4": 4}
+
+# Languages for style 4 (English is left out - it's the default language, and a subject)
+LANGUAGES = (
+    "hindi", "tamil", "telugu", "bengali", "marathi", "gujarati", "kannada",
+    "malayalam", "odia", "punjabi", "urdu", "sanskrit", "assamese", "nepali",
+    "konkani", "french", "spanish", "german", "arabic",
+)
+
+# Keyword (lowercase) -> style number, matched anywhere in the message
+STYLE_KEYWORDS = {
+    # Style 1: Explain with Example
+    "example": 1, "examples": 1, "with example": 1, "with examples": 1,
+    # Style 2: Explain with Memory Technique
+    "memory": 2, "memory technique": 2, "memory techniques": 2, "mnemonic": 2, "mnemonics": 2,
+    # Style 3: Explain using Story
+    "story": 3, "stories": 3, "narrative": 3,
+    # Style 4: Explain using Native Language or User Suggested Language
+    "language": 4, "native": 4, "mother tongue": 4,
+    **dict.fromkeys(LANGUAGES, 4),
+}
+
+# Style number -> value stored in state["current_style"]
+STYLE_NAMES = {1: "with_example", 2: "memory_technique", 3: "story", 4: "native_language"}
+
+# A language named in a message, e.g. "explain in hindi please" -> "hindi"
+_LANGUAGE_RE = re.compile(r"\b(" + "|".join(LANGUAGES) + r")\b")
+
+
+def _build_automaton():
+    """Build the Aho-Corasick automaton over all style keywords."""
+    automaton = ahocorasick.Automaton()
+    for keyword, style in STYLE_KEYWORDS.items():
+        automaton.add_word(keyword, (len(keyword), style))
+    automaton.make_automaton()
+    return automaton
+
+
+if AHOCORASICK_AVAILABLE:
+    _AUTOMATON = _build_automaton()
+else:
+    # Longest keywords first so phrases win over their prefixes
+    _STYLE_RE = re.compile(
+        r"\b(" + "|".join(map(re.escape, sorted(STYLE_KEYWORDS, key=len, reverse=True))) + r")\b"
+    )
+
+
+def _is_whole_word(text: str, start: int, end: int) -> bool:
+    """Check that text[start:end] is not part of a longer word."""
+    return ((start == 0 or not text[start - 1].isalnum())
+            and (end == len(text) or not text[end].isalnum()))
+
+
+def _reply_text(msg: str) -> str:
+    """The message lowercased, without surrounding whitespace and closing punctuation."""
+    return msg.strip().strip(".!)").strip().lower()
+
+
+def is_style_name(msg: str) -> bool:
+    """True if the whole message is a style number or keyword, e.g. "2" or "story"."""
+    reply = _reply_text(msg)
+    return reply in STYLE_DIGITS or reply in STYLE_KEYWORDS
+
+
+def _keyword_styles(text: str):
+    """Yields the style of every whole-word keyword in the lowercased text, in order."""
+    if AHOCORASICK_AVAILABLE:
+        for end, (length, style) in _AUTOMATON.iter(text):
+            if _is_whole_word(text, end - length + 1, end + 1):
+                yield style
+    else:
+        for keyword in _STYLE_RE.findall(text):
+            yield STYLE_KEYWORDS[keyword]
+
+
+def classify_style(msg: str, by_priority: bool = False) -> Optional[int]:
+    """
+    Returns the explanation style (1-4) named in a user message.
+
+    A menu number only counts as the whole reply. Keywords only match as whole
+    words, so "story" does not match "history".
+
+    Args:
+        msg: The user's message, e.g. "2" or "explain using a story"
+        by_priority: When the message names several styles, return the lowest
+            style number (example > memory technique > story > language) instead
+            of the first one named - the order generate_explanation has always used
+
+    Returns:
+        The style number (1-4), or None if the message doesn't name a style
+    """
+    reply = _reply_text(msg)
+    if reply in STYLE_DIGITS:
+        return STYLE_DIGITS[reply]
+    styles = _keyword_styles(msg.lower())
+    if by_priority:
+        return min(styles, default=None)
+    return next(styles, None)
+
+
+def named_language(msg: str) -> Optional[str]:
+    """Returns the first style-4 language named in a message (lowercase), or None."""
+    match = _LANGUAGE_RE.search(msg.lower())
+    return match.group(1) if match else None
@@ -0,0 +1,43 @@
+"""
+Style Templates - Instructions for each explanation style, keyed by style number.
+
+The main agent's instruction only lists the style names. The template for the
+style the student picked is sent with the session state (see
+main_agent._state_block), so the four style descriptions aren't re-sent to the
+model on every call.
+
+STYLE_MENU_TEXT is the fixed style menu shown after the RAG results.
+"""
+
+# Style number (see style_classifier.STYLE_NAMES) -> how to write that explanation
+STYLES = {
+    1: (
+        "Explain with Example: give clear, practical examples and real-world scenarios or analogies "
+        "that illustrate the concept; break complex ideas into simpler, relatable, step-by-step examples."
+    ),
+    2: (
+        "Explain with Memory Technique: use mnemonic devices, acronyms, rhymes, patterns, memorable "
+        "associations or visualizations that help the student remember the information."
+    ),
+    3: (
+        "Explain using Story: build an engaging narrative with characters and a coherent storyline "
+        "that carries the concept, so the explanation is memorable."
+    ),
+    4: (
+        "Explain using Native Language or User Suggested Language: explain in the language the student "
+        "asked for, with culturally appropriate examples and a clear, natural flow."
+    ),
+}
+
+# Style menu sent after the RAG results on the first turn
+STYLE_MENU_TEXT = (
+    "How would you like me to explain this information?\n"
+    "\n"
+    "Please choose one of these explanation styles:\n"
+    "1. With Examples - Practical examples and real-world scenarios\n"
+    "2. With Memory Technique - Mnemonic devices and memory aids\n"
+    "3. Using Story - Narrative-based explanation with characters\n"
+    "4. In Native Language - Explanation in your preferred language\n"
+    "\n"
+    "Reply with the number (1-4) or the style name."
+)
@@ -1,30 +1,44 @@
 """
 Tools for RAG corpus management and GCS operations
 """
-from .corpus_tools import (
+
+# Tool name -> submodule defining it. The submodules are imported on first
+# access (PEP 562): corpus_tools and storage_tools load Vertex AI, GCS and ADK,
+# which e.g. callers of explanation_tools.generate_explanation don't need.
+_TOOL_MODULES = {
     # Corpus management tools
-    create_corpus_tool,
-    update_corpus_tool,
-    list_corpora_tool,
-    get_corpus_tool,
-    delete_corpus_tool,
-    import_document_tool,
+    "create_corpus_tool": "corpus_tools",
+    "update_corpus_tool": "corpus_tools",
+    "list_corpora_tool": "corpus_tools",
+    "get_corpus_tool": "corpus_tools",
+    "delete_corpus_tool": "corpus_tools",
+    "import_document_tool": "corpus_tools",
     
     # File management tools
-    list_files_tool,
-    get_file_tool,
-    delete_file_tool,
+    "list_files_tool": "corpus_tools",
+    "get_file_tool": "corpus_tools",
+    "delete_file_tool": "corpus_tools",
     
     # Query tools
-    query_rag_corpus_tool,
-    search_all_corpora_tool,
-    search_corpus_by_name_tool,
-)
+    "query_rag_corpus_tool": "corpus_tools",
+    "search_all_corpora_tool": "corpus_tools",
+    "search_corpus_by_name_tool": "corpus_tools",
+    
+    # GCS storage tools
+    "create_bucket_tool": "storage_tools",
+    "list_buckets_tool": "storage_tools",
+    "get_bucket_details_tool": "storage_tools",
+    "upload_file_gcs_tool": "storage_tools",
+    "list_blobs_tool": "storage_tools",
+}
+
 
-from .storage_tools import (
-    create_bucket_tool,
-    list_buckets_tool,
-    get_bucket_details_tool,
-    upload_file_gcs_tool,
-    list_blobs_tool,
-) 
\ No newline at end of file
+def __getattr__(name):
+    """Lazily load the tool exports (PEP 562)."""
+    module_name = _TOOL_MODULES.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    from importlib import import_module
+    tool = getattr(import_module(f".{module_name}", __name__), name)
+    globals()[name] = tool
+    return tool
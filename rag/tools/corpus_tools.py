@@ -16,23 +16,206 @@ RAG File Management (within a corpus):
 10. Query RAG files
 """
 
+import asyncio
+import hashlib
+import heapq
+import json
+import logging
+import os
+import re
+import time
+import weakref
+from functools import lru_cache
+
 import vertexai
+from cachetools import TTLCache
+from google.api_core.exceptions import NotFound
+from google.cloud.aiplatform_v1beta1 import types as rag_types
+from google.cloud.aiplatform_v1beta1.services.vertex_rag_service import (
+    VertexRagServiceAsyncClient,
+    VertexRagServiceClient,
+)
+from google.cloud.aiplatform_v1beta1.services.vertex_rag_service.transports import (
+    VertexRagServiceGrpcAsyncIOTransport,
+    VertexRagServiceGrpcTransport,
+)
 from vertexai.preview import rag
 from google.adk.tools import FunctionTool
-from typing import Dict, Optional, Any
+from typing import Dict, Iterable, Optional, Any
 from rag.config import (
     PROJECT_ID,
     LOCATION,
     RAG_DEFAULT_EMBEDDING_MODEL,
     RAG_DEFAULT_TOP_K,
     RAG_DEFAULT_SEARCH_TOP_K,
+    RAG_NAME_SEARCH_TOP_K,
     RAG_DEFAULT_VECTOR_DISTANCE_THRESHOLD,
-    RAG_DEFAULT_PAGE_SIZE
+    RAG_DEFAULT_PAGE_SIZE,
+    RAG_SEARCH_CACHE_TTL,
+    RAG_SEARCH_CACHE_MAXSIZE,
+    RAG_CORPUS_INDEX_CACHE_PATH,
+    RAG_CORPUS_INDEX_MAX_AGE
 )
 
+logger = logging.getLogger(__name__)
+
 # Initialize Vertex AI API
 vertexai.init(project=PROJECT_ID, location=LOCATION)
 
+# Query decomposition for search_corpus_by_name: multi-part questions
+# ("explain Newton's laws and friction") are split into sub-queries at clause
+# boundaries only - commas and question marks mostly separate list items and
+# trailing punctuation, not questions
+_SUBQUERY_SPLIT_RE = re.compile(r"\s+and\s+|;", re.IGNORECASE)
+# Punctuation ignored when comparing sub-queries ("What is X?" == "what is x")
+_SUBQUERY_PUNCTUATION_RE = re.compile(r"[^\w\s]+")
+_SUBQUERY_MIN_CHARS = 4  # Ignore fragments shorter than this
+_SUBQUERY_MAX = 4  # Including the full question
+
+# Lowercased corpus display name -> corpus details, built from one rag.list_corpora()
+# scan on first lookup. Reset to None whenever corpora are created, renamed or deleted.
+_CORPUS_INDEX: Optional[Dict[str, Dict[str, Any]]] = None
+
+# blake2b digest of (corpus name, normalized query, top_k, fast_mode) -> successful
+# search_corpus_by_name response. Shared across sessions; cleared whenever corpora or
+# their files change. Digest keys stay 16 bytes however long the question is.
+_SEARCH_CACHE = TTLCache(maxsize=RAG_SEARCH_CACHE_MAXSIZE, ttl=max(RAG_SEARCH_CACHE_TTL, 1))
+_SEARCH_CACHE_STATS = {"hits": 0, "misses": 0}
+# Same, per retrieval sub-query (corpus id, normalized sub-query, top_k, threshold).
+# Vertex RAG embeds queries server-side, so a hit here skips the query embedding as
+# well as the vector search - e.g. "friction" after "explain Newton's laws and friction".
+_RETRIEVAL_CACHE = TTLCache(maxsize=RAG_SEARCH_CACHE_MAXSIZE, ttl=max(RAG_SEARCH_CACHE_TTL, 1))
+# Retrieval cache key -> the in-flight query for it. Students asking the same question
+# at the same time (e.g. a class working on one exercise) share a single RPC.
+_INFLIGHT_RETRIEVALS: Dict[bytes, "asyncio.Task"] = {}
+_WHITESPACE_RE = re.compile(r"\s+")
+
+# gRPC channel options for the shared RAG retrieval client: keep the HTTP/2
+# connection alive between questions and let concurrent sub-queries multiplex on it
+_RAG_CHANNEL_OPTIONS = [
+    ("grpc.max_send_message_length", -1),
+    ("grpc.max_receive_message_length", -1),
+    ("grpc.keepalive_time_ms", 30000),
+    ("grpc.keepalive_timeout_ms", 10000),
+    ("grpc.keepalive_permit_without_calls", 1),
+    ("grpc.http2.max_pings_without_data", 0),
+]
+
+
+@lru_cache(maxsize=1)
+def _get_rag_client():
+    """
+    Shared Vertex RAG service client on one long-lived gRPC channel, created on first use.
+    
+    rag.retrieval_query() builds a new client (and channel) per call, paying TCP and
+    TLS setup on every query; gRPC clients are thread-safe, so all queries share this one.
+    """
+    api_endpoint = f"{LOCATION}-aiplatform.googleapis.com"
+    channel = VertexRagServiceGrpcTransport.create_channel(api_endpoint, options=_RAG_CHANNEL_OPTIONS)
+    return VertexRagServiceClient(transport=VertexRagServiceGrpcTransport(host=api_endpoint, channel=channel))
+
+
+# Event loop -> async Vertex RAG client. A grpc.aio channel belongs to the loop it
+# was created on, so each loop gets its own client (dropped with the loop).
+_ASYNC_RAG_CLIENTS = weakref.WeakKeyDictionary()
+
+
+def _get_async_rag_client():
+    """
+    Shared asyncio Vertex RAG service client for the running event loop, created on first use.
+    Same channel options as _get_rag_client(); queries await the RPC instead of
+    blocking a worker thread.
+    """
+    loop = asyncio.get_running_loop()
+    client = _ASYNC_RAG_CLIENTS.get(loop)
+    if client is None:
+        api_endpoint = f"{LOCATION}-aiplatform.googleapis.com"
+        channel = VertexRagServiceGrpcAsyncIOTransport.create_channel(api_endpoint, options=_RAG_CHANNEL_OPTIONS)
+        client = _ASYNC_RAG_CLIENTS[loop] = VertexRagServiceAsyncClient(
+            transport=VertexRagServiceGrpcAsyncIOTransport(host=api_endpoint, channel=channel)
+        )
+    return client
+
+
+def _invalidate_corpus_index() -> None:
+    """Drops the cached display name index (and cached searches) so the next lookup rescans the corpora."""
+    global _CORPUS_INDEX
+    _CORPUS_INDEX = None
+    if RAG_CORPUS_INDEX_CACHE_PATH:
+        try:
+            os.remove(RAG_CORPUS_INDEX_CACHE_PATH)
+        except OSError:
+            pass
+    _clear_search_caches()
+
+
+def _load_corpus_index() -> Optional[Dict[str, Dict[str, Any]]]:
+    """
+    Loads the display name index saved by _save_corpus_index(), or None if there is
+    none, it is older than RAG_CORPUS_INDEX_MAX_AGE, or it belongs to another user.
+    """
+    if not RAG_CORPUS_INDEX_CACHE_PATH:
+        return None
+    try:
+        with open(RAG_CORPUS_INDEX_CACHE_PATH, encoding="utf-8") as f:
+            stat = os.fstat(f.fileno())
+            if hasattr(os, "getuid") and stat.st_uid != os.getuid():
+                return None
+            if time.time() - stat.st_mtime > RAG_CORPUS_INDEX_MAX_AGE:
+                return None
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return index if isinstance(index, dict) else None
+
+
+def _save_corpus_index(index: Dict[str, Dict[str, Any]]) -> None:
+    """
+    Saves the display name index for the next cold start. Written (readable by
+    this user only) to a temporary file and renamed into place, so a concurrent
+    reader never sees a partial file.
+    Failures only cost the next process a scan, so they are ignored.
+    """
+    if not RAG_CORPUS_INDEX_CACHE_PATH:
+        return
+    tmp_path = f"{RAG_CORPUS_INDEX_CACHE_PATH}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(RAG_CORPUS_INDEX_CACHE_PATH) or ".", mode=0o700, exist_ok=True)
+        with open(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w", encoding="utf-8") as f:
+            json.dump(index, f, default=str)
+        os.replace(tmp_path, RAG_CORPUS_INDEX_CACHE_PATH)
+    except (OSError, TypeError, ValueError):
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+
+def _clear_search_caches() -> None:
+    """Drops all cached search and retrieval results."""
+    _SEARCH_CACHE.clear()
+    _RETRIEVAL_CACHE.clear()
+
+
+def _normalize_query(query_text: str) -> str:
+    """Lowercases a query and collapses whitespace, so trivially different phrasings share a cache entry."""
+    return _WHITESPACE_RE.sub(" ", query_text.lower().strip())
+
+
+def _cache_key(corpus: str, query_text: str, *options: Any) -> bytes:
+    """Cache key: blake2b digest of the normalized corpus name/id and query plus the query options."""
+    key = "\0".join((corpus.strip().lower(), _normalize_query(query_text), *map(str, options)))
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+
+
+def search_cache_stats() -> Dict[str, int]:
+    """
+    Returns the search cache's counters for tuning RAG_SEARCH_CACHE_TTL/MAXSIZE:
+    hits, misses and the current number of cached searches (size) and
+    cached retrieval sub-queries (retrieval_size).
+    """
+    return {**_SEARCH_CACHE_STATS, "size": len(_SEARCH_CACHE), "retrieval_size": len(_RETRIEVAL_CACHE)}
+
 
 def create_rag_corpus(
     display_name: str,
@@ -69,6 +252,7 @@ def create_rag_corpus(
             description=description or f"RAG corpus: {display_name}",
             embedding_model_config=embedding_model_config,
         )
+        _invalidate_corpus_index()
         
         # Extract corpus ID from the full name
         corpus_id = corpus.name.split('/')[-1]
@@ -128,6 +312,7 @@ def update_rag_corpus(
             corpus=corpus,
             update_mask=["display_name", "description"]
         )
+        _invalidate_corpus_index()
         
         return {
             "status": "success",
@@ -245,7 +430,7 @@ def get_rag_corpus(corpus_id: str) -> Dict[str, Any]:
                 files_count = len(files_response.rag_files)
         except Exception as file_error:
             # If counting files fails, log but continue with zero count
-            print(f"Warning: Could not count files: {str(file_error)}")
+            logger.warning("Could not count files: %s", file_error)
         
         # Extract basic information
         corpus_details = {
@@ -303,6 +488,7 @@ def delete_rag_corpus(corpus_id: str) -> Dict[str, Any]:
         
         # Delete the corpus
         rag.delete_corpus(name=corpus_name)
+        _invalidate_corpus_index()
         
         return {
             "status": "success",
@@ -347,6 +533,7 @@ def import_document_to_corpus(
             corpus_name,
             [gcs_uri]  # Single path in a list
         )
+        _clear_search_caches()  # Cached searches don't include the new document
         
         # Return success result
         return {
@@ -514,6 +701,7 @@ def delete_rag_file(
         
         # Delete the file
         rag.delete_file(name=file_name)
+        _clear_search_caches()  # Cached searches may include the deleted file
         
         return {
             "status": "success",
@@ -543,6 +731,7 @@ def query_rag_corpus(
     Performance Optimization:
     - Default top_k reduced to 3 for faster queries
     - Vector distance filter disabled by default (set threshold=None) for faster processing
+    - Queries share one gRPC connection (see _get_rag_client)
     - Query time depends on corpus size and network latency
     
     Args:
@@ -554,71 +743,132 @@ def query_rag_corpus(
     Returns:
         A dictionary containing the query results
     """
+    try:
+        # Execute the query directly using the API, over the shared gRPC client
+        response = _get_rag_client().retrieve_contexts(
+            request=_retrieve_contexts_request(corpus_id, query_text, top_k, vector_distance_threshold)
+        )
+        return _query_response(corpus_id, query_text, response)
+    except Exception as e:
+        return _query_error(corpus_id, e)
+
+
+async def query_rag_corpus_async(
+    corpus_id: str,
+    query_text: str,
+    top_k: Optional[int] = None,
+    vector_distance_threshold: Optional[float] = None
+) -> Dict[str, Any]:
+    """
+    Async version of query_rag_corpus() on the event loop's async gRPC client
+    (see _get_async_rag_client), so concurrent queries don't each hold a thread.
+    Same arguments and return value as query_rag_corpus().
+    """
+    try:
+        response = await _get_async_rag_client().retrieve_contexts(
+            request=_retrieve_contexts_request(corpus_id, query_text, top_k, vector_distance_threshold)
+        )
+        return _query_response(corpus_id, query_text, response)
+    except Exception as e:
+        return _query_error(corpus_id, e)
+
+
+def _retrieve_contexts_request(
+    corpus_id: str,
+    query_text: str,
+    top_k: Optional[int],
+    vector_distance_threshold: Optional[float]
+):
+    """Builds the RetrieveContextsRequest for a corpus query, applying the default top_k and threshold."""
     if top_k is None:
         top_k = RAG_DEFAULT_TOP_K
     if vector_distance_threshold is None:
         vector_distance_threshold = RAG_DEFAULT_VECTOR_DISTANCE_THRESHOLD
     
-    try:
-        # Construct full corpus resource path
-        corpus_path = f"projects/{PROJECT_ID}/locations/{LOCATION}/ragCorpora/{corpus_id}"
-        
-        # Create the resource config
-        rag_resource = rag.RagResource(rag_corpus=corpus_path)
-        
-        # Configure retrieval parameters - optimize for speed
-        # Only apply filter if threshold is explicitly set (None = no filter = faster)
-        if vector_distance_threshold is not None:
-            retrieval_config = rag.RagRetrievalConfig(
-                top_k=top_k,
-                filter=rag.utils.resources.Filter(vector_distance_threshold=vector_distance_threshold)
-            )
-        else:
-            # No filter = faster query (no distance threshold checking)
-            retrieval_config = rag.RagRetrievalConfig(
-                top_k=top_k
-            )
-        
-        # Execute the query directly using the API
-        response = rag.retrieval_query(
-            rag_resources=[rag_resource],
-            text=query_text,
-            rag_retrieval_config=retrieval_config
+    # Construct full corpus resource path
+    corpus_path = f"projects/{PROJECT_ID}/locations/{LOCATION}/ragCorpora/{corpus_id}"
+    
+    # Create the resource config
+    rag_store = rag_types.RetrieveContextsRequest.VertexRagStore(
+        rag_resources=[rag_types.RetrieveContextsRequest.VertexRagStore.RagResource(rag_corpus=corpus_path)]
+    )
+    
+    # Configure retrieval parameters - optimize for speed
+    # Only apply filter if threshold is explicitly set (None = no filter = faster)
+    if vector_distance_threshold is not None:
+        retrieval_config = rag_types.RagRetrievalConfig(
+            top_k=top_k,
+            filter=rag_types.RagRetrievalConfig.Filter(vector_distance_threshold=vector_distance_threshold)
         )
+    else:
+        # No filter = faster query (no distance threshold checking)
+        retrieval_config = rag_types.RagRetrievalConfig(
+            top_k=top_k
+        )
+    
+    return rag_types.RetrieveContextsRequest(
+        parent=f"projects/{PROJECT_ID}/locations/{LOCATION}",
+        vertex_rag_store=rag_store,
+        query=rag_types.RagQuery(text=query_text, rag_retrieval_config=retrieval_config)
+    )
+
+
+def _context_score(context) -> Optional[float]:
+    """
+    Relevance of a retrieved RagContexts.Context, higher is better: its score, or
+    its negated vector distance when only the distance is reported. None if neither is set.
+    """
+    if "score" in context:
+        return context.score
+    if "distance" in context:
+        return -context.distance
+    return None
+
+
+def _result_rank(result: Dict[str, Any]) -> float:
+    """Sort key for query results: relevance_score, with unscored results last."""
+    score = result.get("relevance_score")
+    return float("-inf") if score is None else score
+
+
+def _query_response(corpus_id: str, query_text: str, response) -> Dict[str, Any]:
+    """Converts a RetrieveContextsResponse into the query_rag_corpus() result dictionary."""
+    results = []
+    if hasattr(response, "contexts"):
+        # Handle different response structures
+        contexts = response.contexts
+        if hasattr(contexts, "contexts"):
+            contexts = contexts.contexts
         
-        # Process the results
-        results = []
-        if hasattr(response, "contexts"):
-            # Handle different response structures
-            contexts = response.contexts
-            if hasattr(contexts, "contexts"):
-                contexts = contexts.contexts
-            
-            # Extract text and metadata from each context
-            for context in contexts:
-                result = {
-                    "text": context.text if hasattr(context, "text") else "",
-                    "source_uri": context.source_uri if hasattr(context, "source_uri") else None,
-                    "relevance_score": context.relevance_score if hasattr(context, "relevance_score") else None
-                }
-                results.append(result)
-        
-        return {
-            "status": "success",
-            "corpus_id": corpus_id,
-            "results": results,
-            "count": len(results),
-            "query": query_text,
-            "message": f"Found {len(results)} results for query: '{query_text}'"
-        }
-        
-    except Exception as e:
-        return {
-            "status": "error",
-            "corpus_id": corpus_id,
-            "error_message": str(e),
-            "message": f"Failed to query corpus: {str(e)}"
-        }
+        # Extract text and metadata from each context
+        for context in contexts:
+            result = {
+                "text": context.text if hasattr(context, "text") else "",
+                "source_uri": context.source_uri if hasattr(context, "source_uri") else None,
+                "relevance_score": _context_score(context)
+            }
+            results.append(result)
+    
+    return {
+        "status": "success",
+        "corpus_id": corpus_id,
+        "results": results,
+        "count": len(results),
+        "query": query_text,
+        "message": f"Found {len(results)} results for query: '{query_text}'"
+    }
+
+
+def _query_error(corpus_id: str, error: Exception) -> Dict[str, Any]:
+    """The query_rag_corpus() result dictionary for a failed query."""
+    return {
+        "status": "error",
+        "corpus_id": corpus_id,
+        "error_message": str(error),
+        # The corpus id no longer exists - e.g. a stale name index entry
+        "not_found": isinstance(error, NotFound),
+        "message": f"Failed to query corpus: {str(error)}"
+    }
 
 # Function to search across all corpora
 def search_all_corpora(
@@ -710,10 +960,7 @@ def search_all_corpora(
                     searched_corpora.append(corpus_name)
         
         # Sort all results by relevance score (if available)
-        all_results.sort(
-            key=lambda x: x.get("relevance_score", 0) if x.get("relevance_score") is not None else 0,
-            reverse=True
-        )
+        all_results.sort(key=_result_rank, reverse=True)
         
         # Format citations summary
         citations_summary = []
@@ -743,11 +990,71 @@ def search_all_corpora(
         }
 
 
+# A corpus name in the "BOARD-grade-GRADE-SUBJECT" shape, as the model may assemble it
+# (any case, spaces or underscores instead of hyphens, e.g. "cbse - Grade 10 - maths")
+_CORPUS_NAME_RE = re.compile(r"^\s*([A-Za-z]+)[\s_-]+grade[\s_-]*(\d{1,2})[\s_-]+([A-Za-z]+)\s*$", re.IGNORECASE)
+
+
+def build_corpus_name(board: str, grade: str, subject: str) -> str:
+    """
+    Builds the corpus display name for a student's board, grade and subject.
+    Lookups are case-insensitive, so only the "BOARD-grade-GRADE-SUBJECT" shape matters.
+    
+    Example: build_corpus_name("cbse", "10", "mathematics") -> "CBSE-grade-10-Mathematics"
+    """
+    return f"{board.strip().upper()}-grade-{str(grade).strip()}-{subject.strip().title()}"
+
+
+def normalize_corpus_name(corpus_name: str) -> str:
+    """
+    Rewrites a "BOARD-grade-GRADE-SUBJECT" name in its canonical build_corpus_name() form,
+    so loosely assembled names find the corpus (and share its search cache) without
+    triggering an index rescan. Other names are returned unchanged.
+    """
+    match = _CORPUS_NAME_RE.match(corpus_name)
+    return build_corpus_name(*match.groups()) if match else corpus_name
+
+
+def _build_corpus_index() -> Dict[str, Dict[str, Any]]:
+    """
+    Lists the corpora once and indexes them by lowercased display name.
+    
+    Note: This API call can take 2-3 seconds if there are many corpora
+    """
+    index = {}
+    for corpus in rag.list_corpora():
+        if not (hasattr(corpus, "display_name") and corpus.display_name):
+            continue
+        
+        # Get corpus status
+        status = None
+        if hasattr(corpus, "corpus_status") and hasattr(corpus.corpus_status, "state"):
+            status = corpus.corpus_status.state
+        elif hasattr(corpus, "corpusStatus") and hasattr(corpus.corpusStatus, "state"):
+            status = corpus.corpusStatus.state
+        
+        # setdefault: the first corpus listed wins, as with the old linear scan
+        index.setdefault(corpus.display_name.strip().lower(), {
+            "id": corpus.name.split('/')[-1],
+            "name": corpus.name,
+            "display_name": corpus.display_name,
+            "description": corpus.description if hasattr(corpus, "description") else None,
+            "create_time": str(corpus.create_time) if hasattr(corpus, "create_time") else None,
+            "status": status
+        })
+    return index
+
+
 def get_corpus_by_name(corpus_name: str) -> Dict[str, Any]:
     """
     Quickly finds a corpus by its display name without counting files.
     This is much faster than list_rag_corpora() when you only need to find one corpus.
-    Uses early exit optimization - stops searching once corpus is found.
+    The corpora are listed once and cached in a name index, so repeat lookups are a
+    dict lookup; a name that isn't in the index triggers one rescan, which picks up
+    corpora created elsewhere since the index was built. The index is also saved to
+    RAG_CORPUS_INDEX_CACHE_PATH, so a restarted process doesn't list the corpora again
+    (unless the saved index is older than RAG_CORPUS_INDEX_MAX_AGE).
+    search_corpus_by_name() rescans once when a query finds the indexed id gone.
     
     Args:
         corpus_name: The display name of the RAG corpus to find.
@@ -759,36 +1066,18 @@ def get_corpus_by_name(corpus_name: str) -> Dict[str, Any]:
         - corpus_id: The ID of the corpus (if found)
         - error_message: Present only if an error occurred
     """
+    global _CORPUS_INDEX
     try:
-        # List corpora without file counting for speed
-        # Note: This API call can take 2-3 seconds if there are many corpora
-        corpora = rag.list_corpora()
-        
-        target_corpus = None
         corpus_name_lower = corpus_name.strip().lower()
         
-        # Early exit optimization: stop searching once corpus is found
-        for corpus in corpora:
-            if hasattr(corpus, "display_name") and corpus.display_name:
-                if corpus.display_name.strip().lower() == corpus_name_lower:
-                    corpus_id = corpus.name.split('/')[-1]
-                    
-                    # Get corpus status
-                    status = None
-                    if hasattr(corpus, "corpus_status") and hasattr(corpus.corpus_status, "state"):
-                        status = corpus.corpus_status.state
-                    elif hasattr(corpus, "corpusStatus") and hasattr(corpus.corpusStatus, "state"):
-                        status = corpus.corpusStatus.state
-                    
-                    target_corpus = {
-                        "id": corpus_id,
-                        "name": corpus.name,
-                        "display_name": corpus.display_name,
-                        "description": corpus.description if hasattr(corpus, "description") else None,
-                        "create_time": str(corpus.create_time) if hasattr(corpus, "create_time") else None,
-                        "status": status
-                    }
-                    break  # Early exit - found the corpus, no need to continue
+        if _CORPUS_INDEX is None:
+            # Cold start: reuse the index saved by an earlier process, if any
+            _CORPUS_INDEX = _load_corpus_index()
+        target_corpus = _CORPUS_INDEX.get(corpus_name_lower) if _CORPUS_INDEX is not None else None
+        if target_corpus is None:
+            _CORPUS_INDEX = _build_corpus_index()
+            _save_corpus_index(_CORPUS_INDEX)
+            target_corpus = _CORPUS_INDEX.get(corpus_name_lower)
         
         if not target_corpus:
             return {
@@ -811,7 +1100,124 @@ def get_corpus_by_name(corpus_name: str) -> Dict[str, Any]:
         }
 
 
-def search_corpus_by_name(
+def resolve_corpus_name(corpus_names: Iterable[Optional[str]]) -> Optional[str]:
+    """
+    Returns the first of corpus_names that names an existing corpus (compared like
+    get_corpus_by_name() does), or None. The name index is rescanned at most once,
+    when none of the names is in it, so trying several spellings costs one listing.
+    """
+    global _CORPUS_INDEX
+    names = [name for name in corpus_names if name]
+    try:
+        for rescan in (False, True):
+            if rescan:
+                _CORPUS_INDEX = _build_corpus_index()
+                _save_corpus_index(_CORPUS_INDEX)
+            elif _CORPUS_INDEX is None:
+                _CORPUS_INDEX = _load_corpus_index()
+            for name in names:
+                if _CORPUS_INDEX is not None and normalize_corpus_name(name).strip().lower() in _CORPUS_INDEX:
+                    return name
+    except Exception as e:
+        logger.warning("Could not resolve corpus names %s: %s", names, e)
+    return None
+
+
+def _split_query(query_text: str) -> list:
+    """
+    Splits a multi-part question into sub-queries.
+    The full question always comes first, so decomposition can only add recall.
+    Sub-queries are compared ignoring case, whitespace and punctuation, so a
+    question without a clause boundary is sent as one query.
+    """
+    queries = [query_text]
+    seen = {_normalize_query(_SUBQUERY_PUNCTUATION_RE.sub(" ", query_text))}
+    for part in _SUBQUERY_SPLIT_RE.split(query_text):
+        part = part.strip()
+        key = _normalize_query(_SUBQUERY_PUNCTUATION_RE.sub(" ", part))
+        if len(key) >= _SUBQUERY_MIN_CHARS and key not in seen:
+            seen.add(key)
+            queries.append(part)
+        if len(queries) == _SUBQUERY_MAX:
+            break
+    return queries
+
+
+def _merge_query_responses(
+    corpus_id: str,
+    query_text: str,
+    queries: list,
+    responses: list,
+    top_k: Optional[int]
+) -> Dict[str, Any]:
+    """
+    Merges query_rag_corpus responses for several sub-queries into one response.
+    Duplicate chunks (same source and text) keep their best relevance score, and
+    the merged results are ranked by score and capped at top_k.
+    """
+    if top_k is None:
+        top_k = RAG_DEFAULT_TOP_K
+    
+    successful = [response for response in responses if response["status"] == "success"]
+    if not successful:
+        return responses[0]
+    
+    merged = {}
+    for response in successful:
+        for result in response.get("results", []):
+            key = (result.get("source_uri"), result.get("text"))
+            best = merged.get(key)
+            if best is None or _result_rank(result) > _result_rank(best):
+                merged[key] = result
+    
+    # Only the top_k best are kept - a bounded heap instead of sorting every merged chunk
+    results = heapq.nlargest(top_k, merged.values(), key=_result_rank)
+    
+    return {
+        "status": "success",
+        "corpus_id": corpus_id,
+        "results": results,
+        "count": len(results),
+        "query": query_text,
+        "sub_queries": queries,
+        "message": f"Found {len(results)} results for query: '{query_text}'"
+    }
+
+
+async def _retrieve(
+    corpus_id: str,
+    query_text: str,
+    top_k: Optional[int],
+    vector_distance_threshold: Optional[float]
+) -> Dict[str, Any]:
+    """
+    Runs one query_rag_corpus_async() call through the retrieval cache.
+    Concurrent calls for the same sub-query wait on the one query already in flight.
+    The cache is only touched on the event loop thread, so it needs no lock.
+    """
+    cache_key = _cache_key(corpus_id, query_text, top_k, vector_distance_threshold)
+    if RAG_SEARCH_CACHE_TTL > 0:
+        cached = _RETRIEVAL_CACHE.get(cache_key)
+        if cached is not None:
+            return cached
+    
+    inflight = _INFLIGHT_RETRIEVALS.get(cache_key)
+    if inflight is None:
+        inflight = _INFLIGHT_RETRIEVALS[cache_key] = asyncio.create_task(query_rag_corpus_async(
+            corpus_id=corpus_id,
+            query_text=query_text,
+            top_k=top_k,
+            vector_distance_threshold=vector_distance_threshold
+        ))
+        inflight.add_done_callback(lambda _: _INFLIGHT_RETRIEVALS.pop(cache_key, None))
+    # Shielded: a cancelled search must not cancel the query other searches wait on
+    response = await asyncio.shield(inflight)
+    if RAG_SEARCH_CACHE_TTL > 0 and response["status"] == "success":
+        _RETRIEVAL_CACHE[cache_key] = response
+    return response
+
+
+async def search_corpus_by_name(
     corpus_name: str,
     query_text: str,
     top_k: Optional[int] = None,
@@ -821,10 +1227,20 @@ def search_corpus_by_name(
     Finds a corpus by its display name and performs a search query on it.
     Uses the fast get_corpus_by_name() function for quick lookup.
     
+    Multi-part questions (e.g. "explain Newton's laws and friction") are split into
+    up to 4 sub-queries (the full question plus its parts) which are queried
+    concurrently; the results are deduplicated and ranked by relevance score.
+    
+    Successful results are cached for RAG_SEARCH_CACHE_TTL seconds (default 24h) per
+    corpus and normalized query, so a question asked again, in any session, returns
+    without querying Vertex AI.
+    
     Performance Notes:
-    - Corpus lookup: ~3-5 seconds (depends on number of corpora)
+    - Corpus lookup: ~3-5 seconds on the first search (depends on number of corpora),
+      then a cached dict lookup
     - RAG query: ~5-25 seconds (depends on corpus size and network)
-    - Optimizations applied: top_k=3, no distance filter by default
+    - Sub-queries run concurrently on the async gRPC client, so a multi-part question costs about one query
+    - Optimizations applied: top_k=RAG_NAME_SEARCH_TOP_K (5), no distance filter by default
     
     To speed up further:
     1. Use corpus_id directly with query_rag_corpus() to skip lookup (saves 3-5 sec)
@@ -834,30 +1250,55 @@ def search_corpus_by_name(
     Args:
         corpus_name: The display name of the RAG corpus to search.
         query_text: The question to ask the corpus.
-        top_k: Maximum number of results (default: 3, set to 1 for fastest)
+        top_k: Maximum number of results (default: RAG_NAME_SEARCH_TOP_K, set to 1 for fastest)
         fast_mode: If True, disables distance threshold filter for faster queries (default: True)
 
     Returns:
         A dictionary containing the search results and citation summary.
     """
+    corpus_name = normalize_corpus_name(corpus_name)
+    if top_k is None:
+        top_k = RAG_NAME_SEARCH_TOP_K
+    cache_key = _cache_key(corpus_name, query_text, top_k, fast_mode)
+    if RAG_SEARCH_CACHE_TTL > 0:
+        cached = _SEARCH_CACHE.get(cache_key)
+        if cached is not None:
+            _SEARCH_CACHE_STATS["hits"] += 1
+            return cached
+        _SEARCH_CACHE_STATS["misses"] += 1
+    
     try:
-        # Step 1: Find corpus by name (~3-5 seconds if many corpora)
-        # Use the fast lookup function instead of list_rag_corpora()
-        corpus_response = get_corpus_by_name(corpus_name)
-        
-        if corpus_response["status"] != "success":
-            return corpus_response
-        
-        # Step 2: Query the corpus with optimizations
-        corpus_id = corpus_response["corpus_id"]
         # Use None for threshold if fast_mode to skip filtering
         threshold = None if fast_mode else RAG_DEFAULT_VECTOR_DISTANCE_THRESHOLD
-        return query_rag_corpus(
-            corpus_id=corpus_id, 
-            query_text=query_text, 
-            top_k=top_k,
-            vector_distance_threshold=threshold
-        )
+        queries = _split_query(query_text)
+        for attempt in range(2):
+            # Step 1: Find corpus by name (cached after the first lookup)
+            # Use the fast lookup function instead of list_rag_corpora()
+            # The Vertex RAG SDK is blocking, so calls run in worker threads
+            corpus_response = await asyncio.to_thread(get_corpus_by_name, corpus_name)
+            
+            if corpus_response["status"] != "success":
+                return corpus_response
+            
+            # Step 2: Query the corpus with optimizations, one query per sub-query in parallel
+            corpus_id = corpus_response["corpus_id"]
+            responses = await asyncio.gather(*(
+                _retrieve(corpus_id, query, top_k, threshold) for query in queries
+            ))
+            # A corpus deleted or recreated elsewhere leaves a stale id in the name
+            # index: rescan the corpora and retry once
+            if attempt == 0 and any(response.get("not_found") for response in responses):
+                _invalidate_corpus_index()
+                continue
+            break
+        
+        if len(responses) == 1:
+            response = responses[0]
+        else:
+            response = _merge_query_responses(corpus_id, query_text, queries, responses, top_k)
+        if RAG_SEARCH_CACHE_TTL > 0 and response["status"] == "success":
+            _SEARCH_CACHE[cache_key] = response
+        return response
     except Exception as e:
         return {"status": "error", "error_message": str(e), "message": f"An unexpected error occurred while searching by name: {e}"}
 
@@ -878,4 +1319,6 @@ delete_file_tool = FunctionTool(delete_rag_file)
 query_rag_corpus_tool = FunctionTool(query_rag_corpus)
 search_all_corpora_tool = FunctionTool(search_all_corpora) 
 search_corpus_by_name_tool = FunctionTool(search_corpus_by_name)
+# Name the model calls the search tool by (FunctionTool uses the function name)
+SEARCH_TOOL_NAME = search_corpus_by_name.__name__
 get_corpus_by_name_tool = FunctionTool(get_corpus_by_name)
\ No newline at end of file
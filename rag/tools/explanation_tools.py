@@ -1,15 +1,138 @@
 """
 Explanation Tools - Functions for generating explanations in different styles.
 """
-from google.adk.tools import FunctionTool
-from typing import Dict, Any, Optional
-import json
+from functools import lru_cache
+from typing import TYPE_CHECKING, Dict, Any, List, Optional, Tuple
+import hashlib
+import re
+
+from rag.config import EXPLANATION_CONTEXT_MAX_CHARS
+from rag.style_classifier import classify_style, named_language
+
+if TYPE_CHECKING:
+    from google.adk.tools.tool_context import ToolContext
+
+# Style number (see style_classifier) -> instruction for the explanation prompt.
+# Style 4 (native or user suggested language) is built per call from the language.
+_STYLE_INSTRUCTIONS = {
+    1: "Explain with clear, practical examples. Use real-world scenarios and step-by-step examples.",
+    2: "Explain using memory techniques, mnemonic devices, acronyms, or memory aids. Create memorable associations.",
+    3: "Explain using an engaging story or narrative. Use characters and scenarios to illustrate the concept.",
+}
+
+# Passages whose whole text matches, ignoring case and whitespace, are duplicates
+_WHITESPACE_RE = re.compile(r"\s+")
+# Explanation request sent to the model (see generate_explanation)
+_PROMPT_TEMPLATE = """Based on the following educational content, provide an explanation {style_instruction}
+
+Question: {question}
+
+Content from textbook:
+{context}
+
+Please provide a comprehensive explanation that:
+1. Is accurate and based on the provided content
+2. Follows the requested explanation style
+3. Is appropriate for the student's grade level
+4. Is clear, engaging, and educational"""
+
+# Appended to the context when passages were left out to stay within the budget
+_TRUNCATED_MARKER = "[... additional passages truncated ...]"
+
+
+def _dedup_texts(texts: List[str]) -> Tuple[List[str], int]:
+    """
+    Returns the non-empty texts with duplicates dropped (first occurrence
+    kept), and the number of duplicates dropped. Passages are compared by a blake2b
+    digest of their whole normalized text, so long passages aren't kept around as set
+    keys - passages that only share an opening (a heading, chapter boilerplate) are kept.
+    Empty texts are skipped - they would only add blank separators to the prompt.
+    """
+    seen = set()
+    unique = []
+    duplicates = 0
+    for text in texts:
+        normalized = _WHITESPACE_RE.sub(" ", text).strip().lower()
+        if not normalized:
+            continue
+        digest = hashlib.blake2b(normalized.encode("utf-8"), digest_size=16).digest()
+        if digest in seen:
+            duplicates += 1
+        else:
+            seen.add(digest)
+            unique.append(text)
+    return unique, duplicates
+
+
+def _within_budget(texts: List[str], max_chars: int) -> Tuple[List[str], int]:
+    """
+    Returns the leading texts that fit in max_chars (counting the blank-line
+    separators), and the number of texts left out or cut. The first text is cut
+    to the budget rather than dropped, so there is always some context.
+    """
+    if max_chars <= 0:
+        return texts, 0
+    kept = []
+    total = 0
+    for text in texts:
+        total += len(text) + (2 if kept else 0)
+        if total > max_chars:
+            break
+        kept.append(text)
+    if not kept and texts:
+        return [texts[0][:max_chars]], len(texts)
+    return kept, len(texts) - len(kept)
+
+
+@lru_cache(maxsize=256)
+def _build_prompt(
+    texts: Tuple[str, ...],
+    explanation_style: str,
+    question: str,
+    max_context_chars: int
+) -> Tuple[str, str, int, int]:
+    """
+    Returns the explanation prompt, the context it embeds, and the number of
+    duplicate and truncated passages, for generate_explanation. Keyed on the
+    result texts themselves, so a cached prompt always matches its content.
+    """
+    # Combine the result texts in one pass, dropping empty and duplicate passages
+    unique, duplicates_removed = _dedup_texts(list(texts))
+    # Results arrive ranked by relevance, so the budget keeps the most relevant passages
+    unique, passages_truncated = _within_budget(unique, max_context_chars)
+    context_text = "\n\n".join(unique)
+    if passages_truncated:
+        context_text += "\n\n" + _TRUNCATED_MARKER
+    
+    # Determine explanation style (default: example). When several styles are named,
+    # example > memory technique > story > language, as this tool has always done
+    style = classify_style(explanation_style, by_priority=True) or 1
+    if style == 4:
+        # Extract language if specified: a known language name, else what follows "in"
+        style_lower = explanation_style.lower().strip()
+        language = named_language(style_lower)
+        if language is None and "in " in style_lower:
+            language = style_lower.split("in ")[-1].strip()
+        elif language is None:
+            language = "the student's preferred"  # e.g. just "4" or "native language"
+        style_instruction = f"Explain in {language} language. Use culturally appropriate examples and natural language flow."
+    else:
+        style_instruction = _STYLE_INSTRUCTIONS[style]
+    
+    # Format the explanation request
+    explanation_prompt = _PROMPT_TEMPLATE.format(
+        style_instruction=style_instruction,
+        question=question,
+        context=context_text
+    )
+    return explanation_prompt, context_text, duplicates_removed, passages_truncated
 
 
 def generate_explanation(
     rag_results: Dict[str, Any],
     explanation_style: str = "with example",
-    question: Optional[str] = None
+    question: Optional[str] = None,
+    max_context_chars: int = EXPLANATION_CONTEXT_MAX_CHARS
 ) -> Dict[str, Any]:
     """
     Generates an explanation based on RAG results in the specified style.
@@ -22,6 +145,8 @@ def generate_explanation(
             - "using story" or "story": Explain through narrative
             - "in [language]" or specific language name: Explain in native/user language
         question: The original question (optional, for context)
+        max_context_chars: Character budget for the textbook content; passages past
+            it are left out, keeping the search's ranking order (0 = no cap)
     
     Returns:
         A dictionary containing the explanation in the requested style
@@ -36,45 +161,16 @@ def generate_explanation(
                 "error": "Empty results"
             }
         
-        # Combine all result texts
-        context_text = "\n\n".join([
-            result.get("text", "") for result in results
-        ])
-        
-        # Determine explanation style
-        style_lower = explanation_style.lower().strip()
-        
-        if "example" in style_lower:
-            style_instruction = "Explain with clear, practical examples. Use real-world scenarios and step-by-step examples."
-        elif "memory" in style_lower or "mnemonic" in style_lower:
-            style_instruction = "Explain using memory techniques, mnemonic devices, acronyms, or memory aids. Create memorable associations."
-        elif "story" in style_lower or "narrative" in style_lower:
-            style_instruction = "Explain using an engaging story or narrative. Use characters and scenarios to illustrate the concept."
-        elif "language" in style_lower or any(word in style_lower for word in ["hindi", "tamil", "telugu", "bengali", "marathi", "gujarati", "kannada", "malayalam", "odia", "punjabi", "urdu"]):
-            # Extract language if specified
-            language = explanation_style
-            if "in " in style_lower:
-                language = style_lower.split("in ")[-1].strip()
-            style_instruction = f"Explain in {language} language. Use culturally appropriate examples and natural language flow."
-        else:
-            # Default to example
-            style_instruction = "Explain with clear, practical examples. Use real-world scenarios and step-by-step examples."
-        
-        # Format the explanation request
-        explanation_prompt = f"""
-        Based on the following educational content, provide an explanation {style_instruction}
-        
-        Question: {question or "General explanation"}
-        
-        Content from textbook:
-        {context_text}
-        
-        Please provide a comprehensive explanation that:
-        1. Is accurate and based on the provided content
-        2. Follows the requested explanation style
-        3. Is appropriate for the student's grade level
-        4. Is clear, engaging, and educational
-        """
+        # Built prompts are cached, so asking the same question again (or toggling
+        # back to a style) reuses the prompt instead of redoing dedup and formatting
+        hits = _build_prompt.cache_info().hits
+        explanation_prompt, context_text, duplicates_removed, passages_truncated = _build_prompt(
+            tuple(result.get("text") or "" for result in results),
+            explanation_style,
+            question or "General explanation",
+            max_context_chars
+        )
+        cache_hit = _build_prompt.cache_info().hits > hits
         
         return {
             "status": "success",
@@ -82,6 +178,9 @@ def generate_explanation(
             "explanation_prompt": explanation_prompt,
             "rag_context": context_text,
             "results_count": len(results),
+            "duplicates_removed": duplicates_removed,
+            "passages_truncated": passages_truncated,
+            "cache_hit": cache_hit,
             "message": f"Explanation ready to be generated in '{explanation_style}' style"
         }
         
@@ -93,6 +192,58 @@ def generate_explanation(
         }
 
 
-# Create FunctionTool from the function
-generate_explanation_tool = FunctionTool(generate_explanation)
+def fetch_passage(passage_id: int, tool_context: "ToolContext") -> Dict[str, Any]:
+    """
+    Returns the verbatim text of one stored RAG passage.
+    
+    Session state only shows the model a compact note of the RAG results with
+    passage ids; this tool expands a passage when the exact textbook wording is needed.
+    Read-only, so several calls in one model response can safely run concurrently.
+    
+    Args:
+        passage_id: The id of the passage, as listed in the RAG note
+        tool_context: Provided by ADK - gives access to session state
+    
+    Returns:
+        A dictionary containing the passage text and source
+    """
+    results = (tool_context.state.get("rag_results") or {}).get("results") or []
+    if not 0 <= passage_id < len(results):
+        return {
+            "status": "error",
+            "error_message": f"No passage with id {passage_id}",
+            "message": f"Passage ids range from 0 to {len(results) - 1}"
+        }
+    result = results[passage_id]
+    return {
+        "status": "success",
+        "passage_id": passage_id,
+        "text": result.get("text", ""),
+        "source_uri": result.get("source_uri")
+    }
+
+
+# FunctionTools are created on first use, so callers that only need
+# generate_explanation() don't import ADK
+@lru_cache(maxsize=1)
+def get_generate_explanation_tool():
+    """Returns the generate_explanation FunctionTool (created once)."""
+    from google.adk.tools import FunctionTool
+    return FunctionTool(generate_explanation)
+
+
+@lru_cache(maxsize=1)
+def get_fetch_passage_tool():
+    """Returns the fetch_passage FunctionTool (created once)."""
+    from google.adk.tools import FunctionTool
+    return FunctionTool(fetch_passage)
+
+
+def __getattr__(name):
+    """Keep the module-level tool names importable with the lazy factories (PEP 562)."""
+    if name == "generate_explanation_tool":
+        return get_generate_explanation_tool()
+    if name == "fetch_passage_tool":
+        return get_fetch_passage_tool()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
@@ -9,22 +9,13 @@ from google.cloud import storage
 from google.api_core.exceptions import GoogleAPIError
 from google.adk.tools import ToolContext, FunctionTool
 from typing import Dict, Any, Optional
-import logging
 from rag.config import (
     PROJECT_ID,
     GCS_DEFAULT_STORAGE_CLASS,
     GCS_DEFAULT_LOCATION,
     GCS_LIST_BUCKETS_MAX_RESULTS,
     GCS_LIST_BLOBS_MAX_RESULTS,
-    GCS_DEFAULT_CONTENT_TYPE,
-    LOG_LEVEL,
-    LOG_FORMAT
-)
-
-# Configure logging
-logging.basicConfig(
-    level=getattr(logging, LOG_LEVEL),
-    format=LOG_FORMAT
+    GCS_DEFAULT_CONTENT_TYPE
 )
 
 # Initialize the GCS client
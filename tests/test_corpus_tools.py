@@ -0,0 +1,78 @@
+"""
+Tests for the Vertex RAG response handling in rag.tools.corpus_tools.
+Responses are built from the real v1beta1 protos, so a renamed field shows up here.
+"""
+from google.cloud.aiplatform_v1beta1 import types as rag_types
+
+from rag.tools import corpus_tools
+from rag.tools.corpus_tools import _merge_query_responses, _query_response, _split_query
+
+
+def _response(*contexts):
+    return rag_types.RetrieveContextsResponse(
+        contexts=rag_types.RagContexts(contexts=[rag_types.RagContexts.Context(**c) for c in contexts])
+    )
+
+
+def test_query_response_reads_score():
+    response = _query_response("corpus", "q", _response(
+        {"text": "a", "source_uri": "gs://b/a.pdf", "score": 0.25},
+    ))
+    assert response["results"] == [{"text": "a", "source_uri": "gs://b/a.pdf", "relevance_score": 0.25}]
+
+
+def test_query_response_falls_back_to_negated_distance():
+    response = _query_response("corpus", "q", _response({"text": "a", "distance": 0.4}))
+    assert response["results"][0]["relevance_score"] == -0.4
+
+
+def test_query_response_without_score_or_distance():
+    response = _query_response("corpus", "q", _response({"text": "a"}))
+    assert response["results"][0]["relevance_score"] is None
+
+
+def test_merge_ranks_sub_query_results_by_score():
+    first = _query_response("corpus", "q1", _response(
+        {"text": "low", "source_uri": "gs://b/1.pdf", "score": 0.1},
+        {"text": "mid", "source_uri": "gs://b/2.pdf", "score": 0.5},
+    ))
+    second = _query_response("corpus", "q2", _response(
+        {"text": "high", "source_uri": "gs://b/3.pdf", "score": 0.9},
+        {"text": "low", "source_uri": "gs://b/1.pdf", "score": 0.7},
+    ))
+    merged = _merge_query_responses("corpus", "q", ["q1", "q2"], [first, second], top_k=2)
+    assert [(r["text"], r["relevance_score"]) for r in merged["results"]] == [("high", 0.9), ("low", 0.7)]
+
+
+def test_merge_ranks_unscored_results_last():
+    scored = _query_response("corpus", "q1", _response({"text": "far", "distance": 0.8}))
+    unscored = _query_response("corpus", "q2", _response({"text": "unscored"}))
+    merged = _merge_query_responses("corpus", "q", ["q1", "q2"], [unscored, scored], top_k=1)
+    assert [r["text"] for r in merged["results"]] == ["far"]
+
+
+def test_split_query_keeps_single_clause_questions_whole():
+    assert _split_query("What is photosynthesis?") == ["What is photosynthesis?"]
+    assert _split_query("Which plants, like ferns, need water?") == ["Which plants, like ferns, need water?"]
+
+
+def test_split_query_splits_clauses():
+    assert _split_query("Explain Newton's laws and friction") == [
+        "Explain Newton's laws and friction", "Explain Newton's laws", "friction"
+    ]
+
+
+def test_resolve_corpus_name_takes_the_first_existing_spelling(monkeypatch):
+    monkeypatch.setattr(corpus_tools, "_CORPUS_INDEX", {"cbse-grade-1-math": {"id": "1"}})
+    names = ["CBSE-grade-1-Mathematics", "CBSE-grade-1-Maths", "CBSE-grade-1-Math"]
+    assert corpus_tools.resolve_corpus_name(names) == "CBSE-grade-1-Math"
+    assert corpus_tools.resolve_corpus_name(["cbse - Grade 1 - math", *names]) == "cbse - Grade 1 - math"
+
+
+def test_resolve_corpus_name_rescans_once(monkeypatch):
+    scans = []
+    monkeypatch.setattr(corpus_tools, "_CORPUS_INDEX", {})
+    monkeypatch.setattr(corpus_tools, "_build_corpus_index", lambda: scans.append(1) or {})
+    monkeypatch.setattr(corpus_tools, "_save_corpus_index", lambda index: None)
+    assert corpus_tools.resolve_corpus_name(["CBSE-grade-1-Mathematics", "CBSE-grade-1-Math"]) is None
+    assert len(scans) == 1
@@ -0,0 +1,60 @@
+"""
+Tests for the style handling in rag.tools.explanation_tools.generate_explanation.
+"""
+import pytest
+
+from rag.tools.explanation_tools import _STYLE_INSTRUCTIONS, generate_explanation
+
+RAG_RESULTS = {"results": [{"text": "Plants make food from sunlight."}]}
+
+
+def _prompt(explanation_style):
+    result = generate_explanation(RAG_RESULTS, explanation_style=explanation_style, question="What is photosynthesis?")
+    assert result["status"] == "success"
+    return result["explanation_prompt"]
+
+
+@pytest.mark.parametrize("explanation_style, style", [
+    ("with example", 1),
+    ("english please", 1),  # not a language request - falls back to examples
+    ("4 examples", 1),
+    ("hindi example", 1),  # example takes priority over a language
+    ("memory technique", 2),
+    ("story in tamil", 3),  # story takes priority over a language
+])
+def test_style_instruction(explanation_style, style):
+    assert _STYLE_INSTRUCTIONS[style] in _prompt(explanation_style)
+
+
+@pytest.mark.parametrize("explanation_style, language", [
+    ("in hindi", "hindi"),
+    ("explain in hindi please", "hindi"),
+    ("Tamil", "tamil"),
+    ("in my mother tongue", "my mother tongue"),
+    ("4", "the student's preferred"),
+])
+def test_language_instruction(explanation_style, language):
+    assert f"Explain in {language} language." in _prompt(explanation_style)
+
+
+def test_repeated_call_is_a_cache_hit():
+    first = generate_explanation(RAG_RESULTS, explanation_style="using story", question="Why?")
+    second = generate_explanation(RAG_RESULTS, explanation_style="using story", question="Why?")
+    assert second["cache_hit"] and second["explanation_prompt"] == first["explanation_prompt"]
+
+
+def test_duplicate_passages_are_dropped():
+    results = {"results": [{"text": "Plants make food."}, {"text": "  plants MAKE\nfood. "}, {"text": ""}]}
+    result = generate_explanation(results, question="Why?")
+    assert result["duplicates_removed"] == 1
+    assert result["rag_context"] == "Plants make food."
+
+
+def test_passages_sharing_an_opening_are_kept():
+    heading = "Chapter 3: Nutrition in Plants. " * 8
+    results = {"results": [{"text": heading + "Leaves hold chlorophyll."},
+                           {"text": heading + "Roots absorb water."}]}
+    result = generate_explanation(results, question="Why?")
+    assert result["duplicates_removed"] == 0
+    assert "Leaves hold chlorophyll." in result["rag_context"]
+    assert "Roots absorb water." in result["rag_context"]
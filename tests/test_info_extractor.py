@@ -0,0 +1,43 @@
+"""
+Tests for rag.info_extractor.
+"""
+import pytest
+
+from rag.info_extractor import StudentInfo, extract_student_info, subject_spellings
+
+
+@pytest.mark.parametrize("msg, info", [
+    ("CBSE-grade-8-History. Question: What is history?",
+     StudentInfo("CBSE", "8", "History", "What is history?")),
+    ("cbse class 8 history. Question: what is history?",
+     StudentInfo("CBSE", "8", "History", "what is history?")),
+    # A header after the labelled question ends it
+    ("question: what is history? CBSE class 8 history",
+     StudentInfo("CBSE", "8", "History", "what is history?")),
+    ("Question: why did class 10 fail? ICSE grade 9 maths",
+     StudentInfo("ICSE", "9", "Mathematics", "why did class 10 fail?")),
+    # The subject may only be named in the question
+    ("Question: what is a cell in biology? class 9 CBSE",
+     StudentInfo("CBSE", "9", "Biology", "what is a cell in biology?")),
+    ("I'm in class 7 CBSE, science. Can you help me? Why is the sky blue?",
+     StudentInfo("CBSE", "7", "Science", "Why is the sky blue?")),
+    ("Why is the sky blue? CBSE class 7 science",
+     StudentInfo("CBSE", "7", "Science", "Why is the sky blue?")),
+])
+def test_extract_student_info(msg, info):
+    assert extract_student_info(msg) == info
+
+
+@pytest.mark.parametrize("msg", [
+    "CBSE class 7 science. Can you help me?",  # no topic
+    "class 7 science. Why is the sky blue?",  # no board
+    "CBSE science. Why is the sky blue?",  # no grade
+    "Question: why is the sky blue?",
+])
+def test_incomplete_messages_are_left_to_the_model(msg):
+    assert extract_student_info(msg) is None
+
+
+def test_subject_spellings():
+    assert subject_spellings("Mathematics") == ("Mathematics", "maths", "math")
+    assert subject_spellings("Science") == ("Science",)
@@ -0,0 +1,69 @@
+"""
+Tests for rag.router.route.
+"""
+import pytest
+from google.genai import types
+
+from rag.router import route, style_output_key
+from rag.style_templates import STYLE_MENU_TEXT
+
+RAG_RESULTS = {"status": "success", "results": [{"text": "Plants make food from sunlight."}]}
+
+
+def _user(text):
+    return [types.Content(role="user", parts=[types.Part(text=text)])]
+
+
+def _text(content):
+    return content.parts[0].text if content is not None else None
+
+
+@pytest.mark.parametrize("state, key", [
+    ({"current_style": "story"}, "story"),
+    ({"current_style": "native_language", "style_language": "tamil"}, "native_language:tamil"),
+    ({"current_style": "native_language", "style_language": None}, "native_language"),
+    ({"current_style": "story", "style_language": "tamil"}, "story"),
+    ({}, None),
+])
+def test_style_output_key(state, key):
+    assert style_output_key(state) == key
+
+
+def test_cached_style_is_served():
+    state = {"rag_results": RAG_RESULTS, "current_style": "story", "_style_toggle": True,
+             "style_outputs": {"story": "Once upon a time..."}}
+    assert _text(route(state, _user("story"))) == "Once upon a time..."
+
+
+def test_cached_language_is_not_served_for_another_language():
+    state = {"rag_results": RAG_RESULTS, "current_style": "native_language", "style_language": "tamil",
+             "_style_toggle": True, "style_outputs": {"native_language:hindi": "Hindi explanation"}}
+    assert route(state, _user("tamil")) is None
+    state["style_language"] = "hindi"
+    assert _text(route(state, _user("hindi"))) == "Hindi explanation"
+
+
+def test_cached_style_needs_a_style_toggle():
+    state = {"rag_results": RAG_RESULTS, "current_style": "story", "_style_toggle": False,
+             "style_outputs": {"story": "Once upon a time..."}}
+    assert route(state, _user("tell me more about leaves")) is None
+
+
+def test_student_message_is_answered_with_a_search_call():
+    routed = route({}, _user("question: what is history? CBSE class 8 history"))
+    call = routed.parts[0].function_call
+    assert call.name == "search_corpus_by_name"
+    assert call.args == {"corpus_name": "CBSE-grade-8-History", "query_text": "what is history?"}
+
+
+def test_incomplete_student_message_needs_the_model():
+    assert route({}, _user("Can you help me with history?")) is None
+
+
+def test_search_response_is_presented_with_the_style_menu():
+    contents = [types.Content(role="user", parts=[types.Part(function_response=types.FunctionResponse(
+        name="search_corpus_by_name", response=RAG_RESULTS
+    ))])]
+    text = _text(route({}, contents))
+    assert "Plants make food from sunlight." in text
+    assert text.endswith(STYLE_MENU_TEXT)
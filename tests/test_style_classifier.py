@@ -0,0 +1,33 @@
+"""
+Tests for rag.style_classifier.
+"""
+import pytest
+
+from rag.style_classifier import classify_style, is_style_name
+
+
+@pytest.mark.parametrize("msg, style", [
+    ("1", 1),
+    ("2.", 2),
+    ("story", 3),
+    ("with examples", 1),
+    ("explain using a story", 3),
+    ("explain in hindi", 4),
+    ("give me 4 examples", 1),  # a number inside a sentence is not a menu choice
+    ("english please", None),  # English is the default language, not style 4
+    ("option 2", None),
+    ("history of india", None),  # "story" only matches as a whole word
+])
+def test_classify_style(msg, style):
+    assert classify_style(msg) == style
+
+
+@pytest.mark.parametrize("msg, expected", [
+    ("2", True),
+    ("Story!", True),
+    ("memory technique", True),
+    ("give me 4 examples", False),
+    ("another example please", False),
+])
+def test_is_style_name(msg, expected):
+    assert is_style_name(msg) is expected